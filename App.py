@@ -1,30 +1,109 @@
-from flask import Flask, request, render_template_string
+from flask import Flask, request, render_template_string, jsonify
 import webbrowser
 import threading
 import pandas as pd
 from Final.text_statistics import show_text_statistics
-from Final.readability_analysis import LexicalFeatures, VocabularyRichnessFeatures, ReadabilityScores
+from Final.readability_analysis import (FeatureEngine, ProfileCache, FEATURES, LexicalFeatures,
+                                        VocabularyRichnessFeatures, ReadabilityScores)
 import araana
-from transformers import pipeline, AutoTokenizer, AutoModelForTokenClassification
+from araana.ner import AraNER
 
-# Load the tokenizer and model
-tokenizer = AutoTokenizer.from_pretrained("arabic-ner")
-model = AutoModelForTokenClassification.from_pretrained("arabic-ner")
+WARMUP_TEXT = "نقلت وكالة رويترز عن ثلاثة دبلوماسيين"
 
-# Update the tokenizer with the max_length parameter
-tokenizer.model_max_length = 10000000
+class LazyAnalyzer:
+    """Loads an analyzer on first use, or ahead of time from the warm-up thread."""
 
-# Initialize NER pipeline
-ner_pipeline = pipeline("token-classification", model=model, tokenizer=tokenizer)
+    def __init__(self, loader, warmup):
+        self.loader = loader
+        self.warmup = warmup
+        self.analyzer = None
+        self.error = None
+        self.lock = threading.Lock()
 
-# Initialize AraNet models
-sentiment_obj = araana.AraAna('araana/models/sentiment_araana')
-dialect_obj = araana.AraAna('araana/models/dialect_araana')
-emotion_obj = araana.AraAna('araana/models/emotion_araana')
-irony_obj = araana.AraAna('araana/models/irony_araana')
+    @property
+    def loaded(self):
+        return self.analyzer is not None
+
+    def get(self):
+        if self.analyzer is None:
+            with self.lock:
+                if self.analyzer is None:
+                    try:
+                        analyzer = self.loader()
+                        # A dummy inference primes the kernels before real traffic arrives
+                        self.warmup(analyzer)
+                    except Exception as e:
+                        self.error = repr(e)
+                        raise
+                    self.analyzer = analyzer
+                    self.error = None
+        return self.analyzer
+
+def load_ner():
+    # Long texts are split into overlapping windows that fit the model
+    return AraNER("arabic-ner")
+
+def load_araana():
+    # Initialize AraNet models, the text is normalized and tokenized once for the four tasks and
+    # the tasks whose checkpoints were fine-tuned on the same encoder weights share one encoder
+    return araana.AraAnaMultiTask({
+        'sentiment': 'araana/models/sentiment_araana',
+        'dialect': 'araana/models/dialect_araana',
+        'emotion': 'araana/models/emotion_araana',
+        'irony': 'araana/models/irony_araana',
+    })
+
+analyzers = {
+    'ner': LazyAnalyzer(load_ner, lambda ner: ner.predict(WARMUP_TEXT)),
+    'araana': LazyAnalyzer(load_araana, lambda araana_obj: araana_obj.predict(text=WARMUP_TEXT)),
+}
+
+def warm_up():
+    for analyzer in analyzers.values():
+        try:
+            analyzer.get()
+        except Exception:
+            # The error is reported by /readyz, and loading is retried on the next request
+            pass
+
+# Load the models in the background so the app accepts traffic right away
+threading.Thread(target=warm_up, daemon=True).start()
+
+# Intermediate results of the recently analyzed texts, reused when more features of a text are asked for,
+# bounded in number of texts and in total characters
+profile_cache = ProfileCache(maxsize=256, max_characters=2000000)
 
 app = Flask(__name__)
 
+@app.route('/healthz')
+def healthz():
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz')
+def readyz():
+    status = {name: {'loaded': analyzer.loaded, 'error': analyzer.error} for name, analyzer in analyzers.items()}
+    ready = all(analyzer.loaded for analyzer in analyzers.values())
+    return jsonify({'ready': ready, 'analyzers': status}), 200 if ready else 503
+
+@app.route('/metrics', methods=['POST'])
+def metrics():
+    # Only the requested text features and what they depend on, without the transformer models
+    payload = request.get_json(silent=True) or request.form
+    text = payload.get('text')
+    if not text:
+        return jsonify({'error': 'text is required'}), 400
+    features = payload.get('features') or FEATURES
+    if isinstance(features, str):
+        features = features.split(',')
+    try:
+        values = FeatureEngine([text], cache=profile_cache).select(features).iloc[0]
+    except ZeroDivisionError:
+        return jsonify({'error': 'the text has no Arabic words'}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({feature: float(value) for feature, value in values.items()})
+
+
 @app.route('/')
 def home():
     sample_text = "و نقلت وكالة رويترز عن ثلاثة دبلوماسيين في الاتحاد الأوروبي ، أن بلجيكا و إيرلندا و لوكسمبورغ تريد أيضاً مناقشة"
@@ -328,18 +407,16 @@ def analyze_text():
     if file:
         text = file.read().decode('utf-8')
 
-    if len(text) > 500:
-        text = text[:500]
-
 
     # Text statistics
     statistics = show_text_statistics(pd.Series([text]))
     statistics_html = statistics.to_html(classes='center-table', index=False)
 
-    # Readability analysis
-    lexical_features = LexicalFeatures([text])
-    vocabulary_richness = VocabularyRichnessFeatures([text])
-    readability_scores = ReadabilityScores([text])
+    # Readability analysis, the three feature groups share one tokenization of the text
+    engine = FeatureEngine([text], cache=profile_cache)
+    lexical_features = LexicalFeatures([text], engine)
+    vocabulary_richness = VocabularyRichnessFeatures([text], engine)
+    readability_scores = ReadabilityScores([text], engine)
 
     lexical_features_df = lexical_features.compute_features()
     vocabulary_richness_df = vocabulary_richness.compute_features()
@@ -350,10 +427,12 @@ def analyze_text():
     readability_scores_html = readability_scores_df.to_html(classes='center-table', index=False)
 
     # Sentiment and intent analysis
-    sentiment_result = 'Positive Text' if sentiment_obj.predict(text=text)[0][0] == 'pos' else 'Negative Text'
-    dialect_result = dialect_obj.predict(text=text)[0][0].replace("_", " ")
-    emotion_result = emotion_obj.predict(text=text)[0][0].title()
-    irony_result = 'Sarcasm Text' if irony_obj.predict(text=text)[0][0] == '1' else 'Antisarcasm Text'
+    # Long texts are classified over overlapping token windows instead of their first sentence
+    araana_results = analyzers['araana'].get().predict(text=text, long_document=True)
+    sentiment_result = 'Positive Text' if araana_results['sentiment'][0][0] == 'pos' else 'Negative Text'
+    dialect_result = araana_results['dialect'][0][0].replace("_", " ")
+    emotion_result = araana_results['emotion'][0][0].title()
+    irony_result = 'Sarcasm Text' if araana_results['irony'][0][0] == '1' else 'Antisarcasm Text'
 
     sentiment_html = f"""
     <p><strong>Sentiment Analysis:</strong> {sentiment_result}</p>
@@ -363,7 +442,7 @@ def analyze_text():
     """
 
     # Named Entity Recognition (NER)
-    ner_results = ner_pipeline(text)
+    ner_results = analyzers['ner'].get().predict(text)
     ner_html = """
     <table class="center-table">
         <tr>
@@ -0,0 +1,184 @@
+"""
+Text statistics and readability features of corpus files larger than memory.
+
+The file is memory-mapped and split into documents on a configurable delimiter (a line break
+by default), documents are processed in chunks of a fixed number of documents, and the
+feature rows of every chunk are appended to a CSV or Parquet file before the next chunk is
+read. Peak memory depends on the chunk size, not on the size of the corpus.
+
+    python -m Final.corpus -i corpus.txt -o features.parquet -d '\\n\\n' -j 4
+"""
+import functools
+import itertools
+import mmap
+import optparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+from . import parallel
+from .readability_analysis import FEATURES, VectorizedFeatureEngine
+from .text_statistics import _text_statistics_chunk
+
+
+def iter_documents(path, delimiter='\n', encoding='utf-8'):
+    """
+    Yields the non blank documents of the file, split on delimiter, reading it through a
+    memory map so that only the current document is copied into memory.
+    """
+    if not os.path.exists(path):
+        raise Exception("File not found %s" % path)
+    separator = delimiter.encode(encoding)
+    if not separator:
+        raise Exception('The delimiter must not be empty')
+
+    with open(path, 'rb') as corpus_file:
+        if os.fstat(corpus_file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(corpus_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            start = 0
+            while start < len(data):
+                end = data.find(separator, start)
+                if end == -1:
+                    end = len(data)
+                document = data[start:end].decode(encoding)
+                # Windows line endings leave a carriage return before a line break delimiter
+                if separator.startswith(b'\n') and document.endswith('\r'):
+                    document = document[:-1]
+                if document.strip():
+                    yield document
+                start = end + len(separator)
+
+
+def iter_corpus_features(path, delimiter='\n', chunk_size=10000, features=None, statistics=True, n_jobs=1,
+                         encoding='utf-8'):
+    """
+    Yields one DataFrame per chunk_size documents with a Document column (the position of the
+    document among the non blank ones), the text statistics when statistics is True, and the
+    given features (all of them by default). The features come from VectorizedFeatureEngine,
+    so for a document without Arabic words Honore's R, Sichel's measure, Brunet's W and Yule's K
+    are NaN, and Shannon entropy and Simpson's index are 0. With n_jobs > 1 the chunks are
+    computed in a process pool.
+    """
+    features = list(FEATURES if features is None else features)
+    documents = iter_documents(path, delimiter, encoding)
+    chunks = iter(lambda: list(itertools.islice(documents, chunk_size)), [])
+    offset = 0
+    for frame in parallel.imap_chunks(functools.partial(_corpus_chunk, features=features, statistics=statistics),
+                                      chunks, n_jobs):
+        frame.insert(0, 'Document', range(offset, offset + len(frame)))
+        offset += len(frame)
+        yield frame
+
+
+def process_corpus(path, output_path, delimiter='\n', chunk_size=10000, features=None, statistics=True, n_jobs=1,
+                   encoding='utf-8', output_format=None):
+    """
+    Writes the rows of iter_corpus_features to output_path as they are computed, as CSV or
+    Parquet (output_format, or the file extension: .parquet / .pq for Parquet, CSV otherwise).
+    Returns the number of documents.
+    """
+    output_format = output_format or ('parquet' if output_path.endswith(('.parquet', '.pq')) else 'csv')
+    if output_format not in ('csv', 'parquet'):
+        raise Exception('Unknown output format %s, expected csv or parquet' % output_format)
+    writer = _ParquetWriter(output_path) if output_format == 'parquet' else _CsvWriter(output_path)
+
+    count = 0
+    try:
+        for frame in iter_corpus_features(path, delimiter, chunk_size, features, statistics, n_jobs, encoding):
+            writer.write(frame)
+            count += len(frame)
+    finally:
+        writer.close()
+    return count
+
+
+def _corpus_chunk(documents, features, statistics):
+    frames = []
+    if statistics:
+        frames.append(_text_statistics_chunk(documents, include_text=False))
+    if features:
+        frames.append(VectorizedFeatureEngine(documents).select(features))
+    return pd.concat(frames, axis=1) if frames else pd.DataFrame(index=range(len(documents)))
+
+
+class _CsvWriter:
+
+    def __init__(self, output_path):
+        self.output_file = open(output_path, 'w', encoding='utf-8', newline='')
+        self.header = True
+
+    def write(self, frame):
+        frame.to_csv(self.output_file, header=self.header, index=False)
+        self.output_file.flush()
+        self.header = False
+
+    def close(self):
+        self.output_file.close()
+
+
+class _ParquetWriter:
+    """Appends every chunk as a row group, with the column types of the first chunk."""
+
+    def __init__(self, output_path):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise Exception('The parquet output needs the pyarrow package')
+        self.pyarrow = pyarrow
+        self.output_path = output_path
+        self.writer = None
+        self.dtypes = None
+
+    def write(self, frame):
+        if self.writer is None:
+            self.dtypes = frame.dtypes
+            table = self.pyarrow.Table.from_pandas(frame, preserve_index=False)
+            self.writer = self.pyarrow.parquet.ParquetWriter(self.output_path, table.schema)
+        else:
+            table = self.pyarrow.Table.from_pandas(frame.astype(self.dtypes), schema=self.writer.schema,
+                                                   preserve_index=False)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def _unescape(delimiter):
+    # backslash escapes like \n, keeping any non ASCII character of the delimiter as is
+    return delimiter.encode('latin-1', 'backslashreplace').decode('unicode_escape')
+
+
+def main():
+    parser = optparse.OptionParser(
+        usage='python -m Final.corpus -i INPUT -o OUTPUT [-d DELIMITER] [-s CHUNK_SIZE] [-j JOBS]')
+    parser.add_option('-i', '--input', dest='input', help='corpus file')
+    parser.add_option('-o', '--output', dest='output', help='output .csv or .parquet file')
+    parser.add_option('-d', '--delimiter', dest='delimiter', default='\\n',
+                      help='document delimiter, with backslash escapes (default: a line break)')
+    parser.add_option('-s', '--chunk-size', dest='chunk_size', type='int', default=10000,
+                      help='documents read and processed at a time')
+    parser.add_option('-j', '--jobs', dest='jobs', type='int', default=1, help='worker processes, -1 for every core')
+    parser.add_option('-f', '--features', dest='features',
+                      help='comma separated feature columns to compute (default: all)')
+    parser.add_option('--no-statistics', dest='statistics', action='store_false', default=True,
+                      help='leave out the text statistics columns')
+    options, _ = parser.parse_args()
+    if options.input is None or options.output is None:
+        parser.error('the input and output files are required')
+
+    start = time.perf_counter()
+    count = process_corpus(options.input, options.output, _unescape(options.delimiter),
+                           options.chunk_size, options.features.split(',') if options.features else None,
+                           options.statistics, options.jobs)
+    elapsed = time.perf_counter() - start
+    print('%d documents in %.2fs (%.1f documents/s)' % (count, elapsed, count / elapsed if elapsed else 0.0),
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import math
+from collections import Counter, deque
+
+
+class VocabularyRichnessAccumulator:
+    """
+    Vocabulary richness measures of a multiset of words that can grow and shrink one word at a
+    time. Adding or removing a word updates the running word count, number of types, V1/V2,
+    sum of squared frequencies and sum of f * log(f) in O(1), and every measure is then read
+    in O(1) with the same formulas as VocabularyRichnessFeatures.
+
+    The Shannon entropy comes from the running sum of f * log(f), so after millions of updates
+    it can drift from a recomputation by a few ulps per update; call rebuild() to reset it.
+    """
+
+    def __init__(self, words=()):
+        self.freq = Counter()
+        self.N = 0
+        self.V1 = 0
+        self.V2 = 0
+        self.squares = 0
+        self.f_log_f = 0.0
+        for word in words:
+            self.add(word)
+
+    def add(self, word):
+        self.__update(word, 1)
+
+    def remove(self, word):
+        if self.freq[word] == 0:
+            raise Exception('Word %s is not in the window' % word)
+        self.__update(word, -1)
+
+    def clear(self):
+        self.__init__()
+
+    def rebuild(self):
+        """Recomputes the running sums from the frequency table."""
+        self.__init__(self.freq.elements())
+
+    def __update(self, word, step):
+        old = self.freq[word]
+        new = old + step
+        self.V1 += (new == 1) - (old == 1)
+        self.V2 += (new == 2) - (old == 2)
+        self.squares += new * new - old * old
+        self.f_log_f += _f_log_f(new) - _f_log_f(old)
+        self.N += step
+        if new:
+            self.freq[word] = new
+        else:
+            del self.freq[word]
+
+    @property
+    def vocabulary(self):
+        return len(self.freq)
+
+    def hapax_legomenon(self):
+        return self.V1
+
+    def hapax_dislegomenon(self):
+        return self.V2
+
+    def honore_r_measure(self):
+        return self.V1 / self.N
+
+    def sichels_measure(self):
+        return self.V2 / self.N
+
+    def brunets_measure_w(self):
+        return (self.vocabulary - 0.17) / math.log(self.N + 1)
+
+    def yules_characteristic_k(self):
+        return 10000 * (self.squares - self.N) / self.N ** 2
+
+    def shannon_entropy(self):
+        # -sum(f/N * log(f/N)) = log(N) - sum(f * log(f)) / N
+        return math.log(self.N) - self.f_log_f / self.N
+
+    def simpsons_index(self):
+        return self.squares / self.N ** 2
+
+    def compute_features(self):
+        """The measures under the VocabularyRichnessFeatures column names."""
+        return {
+            "Hapax Legomenon": self.hapax_legomenon(),
+            "Hapax DisLegemena": self.hapax_dislegomenon(),
+            "Honores R Measure": self.honore_r_measure(),
+            "Sichel’s Measure": self.sichels_measure(),
+            "Brunet’s Measure W": self.brunets_measure_w(),
+            "Yule’s Characteristic K": self.yules_characteristic_k(),
+            "Shannon Entropy": self.shannon_entropy(),
+            "Simpson’s Index": self.simpsons_index()
+        }
+
+
+def sliding_windows(words, size, step=1):
+    """
+    Yields the measures of every window of `size` consecutive words, moving `step` words at a
+    time, for a word stream of any length (TextProfile(text).words tokenizes a text).
+    """
+    # checked here rather than in the generator, so a bad argument fails at the call
+    _check_window(size, step)
+    return _sliding_windows(words, size, step)
+
+
+def tumbling_windows(words, size):
+    """
+    Yields the measures of consecutive, non overlapping windows of `size` words. A shorter
+    last window at the end of the stream is included.
+    """
+    _check_window(size)
+    return _tumbling_windows(words, size)
+
+
+def _sliding_windows(words, size, step):
+    accumulator = VocabularyRichnessAccumulator()
+    window = deque()
+    since_last = 0
+    for word in words:
+        window.append(word)
+        accumulator.add(word)
+        if len(window) > size:
+            accumulator.remove(window.popleft())
+        if len(window) == size:
+            if since_last % step == 0:
+                yield accumulator.compute_features()
+            since_last += 1
+
+
+def _tumbling_windows(words, size):
+    accumulator = VocabularyRichnessAccumulator()
+    for word in words:
+        accumulator.add(word)
+        if accumulator.N == size:
+            yield accumulator.compute_features()
+            accumulator.clear()
+    if accumulator.N:
+        yield accumulator.compute_features()
+
+
+def _check_window(size, step=1):
+    if size < 1:
+        raise Exception('The window size must be at least 1, got %s' % size)
+    if step < 1:
+        raise Exception('The window step must be at least 1, got %s' % step)
+
+
+def _f_log_f(f):
+    return f * math.log(f) if f > 0 else 0.0
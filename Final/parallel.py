@@ -0,0 +1,74 @@
+import multiprocessing
+import os
+from collections import deque
+
+# Below this many characters in total the input is processed in the calling process,
+# starting the pool would cost more than it saves
+MIN_PARALLEL_CHARACTERS = 200000
+# Bounds on the characters of one chunk, so that small texts are not sent one by one and
+# a chunk of long texts doesn't hold a worker (and its memory) for too long
+MIN_CHUNK_CHARACTERS = 50000
+MAX_CHUNK_CHARACTERS = 5000000
+# Chunks per worker, more than one so that a slow chunk doesn't leave the other workers idle
+CHUNKS_PER_JOB = 4
+
+
+def resolve_jobs(n_jobs):
+    """Number of processes for n_jobs: None means 1 and negative values count back from the CPU count."""
+    if n_jobs is None:
+        return 1
+    if n_jobs < 0:
+        return max(1, (os.cpu_count() or 1) + 1 + n_jobs)
+    return max(1, n_jobs)
+
+
+def split(texts, n_jobs):
+    """
+    Splits texts into consecutive chunks of similar total length. Returns a single chunk
+    when n_jobs is 1 or the input is too small for a pool to pay off.
+    """
+    texts = list(texts)
+    n_jobs = resolve_jobs(n_jobs)
+    total = sum(len(text) for text in texts)
+    if n_jobs == 1 or len(texts) < 2 or total < MIN_PARALLEL_CHARACTERS:
+        return [texts]
+
+    target = min(max(total // (n_jobs * CHUNKS_PER_JOB), MIN_CHUNK_CHARACTERS), MAX_CHUNK_CHARACTERS)
+    chunks = []
+    start = size = 0
+    for end, text in enumerate(texts, 1):
+        size += len(text)
+        if size >= target:
+            chunks.append(texts[start:end])
+            start, size = end, 0
+    if start < len(texts):
+        chunks.append(texts[start:])
+    return chunks
+
+
+def map_chunks(func, chunks, n_jobs):
+    """Applies func to every chunk in a pool of n_jobs processes and returns the results in order."""
+    if len(chunks) == 1:
+        return [func(chunks[0])]
+    with multiprocessing.Pool(min(resolve_jobs(n_jobs), len(chunks))) as pool:
+        return pool.map(func, chunks, chunksize=1)
+
+
+def imap_chunks(func, chunks, n_jobs):
+    """
+    Like map_chunks for an iterable of chunks of any length: yields the results in order
+    while keeping at most two chunks per process in flight, so memory stays bounded.
+    """
+    n_jobs = resolve_jobs(n_jobs)
+    if n_jobs == 1:
+        for chunk in chunks:
+            yield func(chunk)
+        return
+    with multiprocessing.Pool(n_jobs) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(func, (chunk,)))
+            if len(pending) >= 2 * n_jobs:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
@@ -1,24 +1,397 @@
-import re
+import numpy as np
 import pandas as pd
-from collections import Counter
+from collections import Counter, OrderedDict
+import functools
+from functools import cached_property
 import math
+import threading
+
+from . import parallel, text_kernel
+from .text_kernel import FUNCTIONAL_WORDS, VOWELS
+
+
+LEXICAL_FEATURES = [
+    "Average Word Length", "Average Sentence Length By Word", "Average Sentence Length By Character",
+    "Special Character Count", "Average Syllable per Word", "Functional Words Count", "Punctuation Count"
+]
+VOCABULARY_RICHNESS_FEATURES = [
+    "Hapax Legomenon", "Hapax DisLegemena", "Honores R Measure", "Sichel’s Measure", "Brunet’s Measure W",
+    "Yule’s Characteristic K", "Shannon Entropy", "Simpson’s Index"
+]
+READABILITY_FEATURES = [
+    "Flesch Reading Ease", "Flesch-Kincaid Grade Level", "Gunning Fog Index", "Dale Chall Readability Formula",
+    "Shannon Entropy", "Simpson's Index"
+]
+# Every column of the three groups, Shannon Entropy only once
+FEATURES = list(dict.fromkeys(LEXICAL_FEATURES + VOCABULARY_RICHNESS_FEATURES + READABILITY_FEATURES))
+
+# Dependency graph of the features: every node is computed from the values of the nodes it
+# depends on, starting from the text itself
+NODES = {
+    # tokens and their counts
+    'words': (('text',), text_kernel.arabic_words),
+    'word_count': (('words',), len),
+    'word_characters': (('words',), lambda words: sum(len(word) for word in words)),
+    'sentences': (('text',), text_kernel.sentence_spans),
+    'sentence_count': (('sentences',), len),
+    'sentence_characters': (('sentences',), lambda sentences: sum(end - start for start, end in sentences)),
+    'syllables': (('words',), lambda words: [text_kernel.count_syllables(word) for word in words]),
+    'syllable_count': (('syllables',), sum),
+    'complex_words': (('syllables',), lambda syllables: sum(1 for count in syllables if count > 2)),
+    'functional_words': (('words',), lambda words: sum(1 for word in words if text_kernel.is_functional_word(word))),
+
+    # frequency table
+    'frequencies': (('words',), Counter),
+    'vocabulary': (('frequencies',), len),
+    'V1': (('frequencies',), lambda freq: sum(1 for word in freq if freq[word] == 1)),
+    'V2': (('frequencies',), lambda freq: sum(1 for word in freq if freq[word] == 2)),
+    'squared_frequencies': (('frequencies',), lambda freq: sum(f ** 2 for f in freq.values())),
+
+    # per sentence and per word ratios of the readability formulas, 0 for a text they don't apply to
+    'readable': (('word_count', 'sentence_count'), lambda N, sentences: N > 0 and sentences > 0),
+    'words_per_sentence': (('word_count', 'sentence_count'),
+                           lambda N, sentences: N / sentences if sentences else 0),
+    'syllables_per_word': (('syllable_count', 'word_count'), lambda syllables, N: syllables / N if N else 0),
+
+    # lexical features
+    "Average Word Length": (('word_characters', 'word_count'), lambda characters, N: characters / N if N else 0),
+    # sentences are only split between words, so the words of the sentences are the words of the text
+    "Average Sentence Length By Word": (('word_count', 'sentence_count'),
+                                        lambda N, sentences: N / sentences if sentences else 0),
+    "Average Sentence Length By Character": (('sentence_characters', 'sentence_count'),
+                                             lambda characters, sentences: characters / sentences if sentences else 0),
+    "Special Character Count": (('text',), text_kernel.count_special_characters),
+    "Average Syllable per Word": (('syllable_count', 'word_count'), lambda syllables, N: syllables / N if N else 0),
+    "Functional Words Count": (('functional_words',), lambda count: count),
+    "Punctuation Count": (('text',), text_kernel.count_punctuation),
+
+    # vocabulary richness features
+    "Hapax Legomenon": (('V1',), lambda V1: V1),
+    "Hapax DisLegemena": (('V2',), lambda V2: V2),
+    "Honores R Measure": (('V1', 'word_count'), lambda V1, N: V1 / N),
+    "Sichel’s Measure": (('V2', 'word_count'), lambda V2, N: V2 / N),
+    "Brunet’s Measure W": (('vocabulary', 'word_count'), lambda V, N: (V - 0.17) / math.log(N + 1)),
+    "Yule’s Characteristic K": (('squared_frequencies', 'word_count'), lambda M, N: 10000 * (M - N) / N ** 2),
+    "Shannon Entropy": (('frequencies', 'word_count'), lambda freq, N: _shannon_entropy(freq, N)),
+    "Simpson’s Index": (('frequencies', 'word_count'), lambda freq, N: _simpsons_index(freq, N)),
+
+    # readability features, simplified formulas adapted for Arabic
+    "Flesch Reading Ease": (
+        ('readable', 'words_per_sentence', 'syllables_per_word'),
+        lambda readable, wps, spw: 206.835 - (1.015 * wps) - (84.6 * spw) if readable else 0),
+    "Flesch-Kincaid Grade Level": (
+        ('readable', 'words_per_sentence', 'syllables_per_word'),
+        lambda readable, wps, spw: (0.39 * wps) + (11.8 * spw) - 15.59 if readable else 0),
+    "Gunning Fog Index": (
+        ('readable', 'words_per_sentence', 'complex_words', 'word_count'),
+        lambda readable, wps, complex_words, N: 0.4 * (wps + 100 * (complex_words / N)) if readable else 0),
+    "Dale Chall Readability Formula": (
+        ('readable', 'words_per_sentence', 'functional_words', 'word_count'),
+        lambda readable, wps, functional, N: 0.1579 * (((N - functional) / N) * 100) + 0.0496 * wps
+        if readable else 0),
+    "Simpson's Index": (('frequencies', 'word_count'), lambda freq, N: _simpsons_index(freq, N)),
+}
+
+
+def required_nodes(features):
+    """The nodes needed to compute the given features, every node after its dependencies."""
+    order = []
+
+    def visit(name):
+        if name in order or name == 'text':
+            return
+        if name not in NODES:
+            raise Exception('Unknown feature %s' % name)
+        for dependency in NODES[name][0]:
+            visit(dependency)
+        order.append(name)
+
+    for feature in features:
+        visit(feature)
+    return order
+
+
+class TextProfile:
+    """
+    The nodes of the feature graph for one text, each computed on first use and kept, so a
+    later request for more features of the same text only computes what is missing.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.values = {'text': text}
+
+    def __getitem__(self, name):
+        if name not in self.values:
+            if name not in NODES:
+                raise Exception('Unknown feature %s' % name)
+            dependencies, function = NODES[name]
+            self.values[name] = function(*(self[dependency] for dependency in dependencies))
+        return self.values[name]
+
+    @property
+    def words(self):
+        return self['words']
+
+    @property
+    def frequencies(self):
+        return self['frequencies']
+
+    @property
+    def syllables(self):
+        return self['syllables']
+
+
+class ProfileCache:
+    """
+    Bounded LRU cache of TextProfile by text, to share the computed nodes of a text between
+    FeatureEngine instances (e.g. across requests of the web app). The memory of a profile
+    grows with its text, so the cache is bounded both by the number of texts and by their
+    total number of characters; a text longer than max_characters is profiled but not kept.
+    """
+
+    def __init__(self, maxsize=1024, max_characters=2000000):
+        self.maxsize = maxsize
+        self.max_characters = max_characters
+        self.__profiles = OrderedDict()
+        self.__characters = 0
+        self.__lock = threading.Lock()
+
+    def profile(self, text):
+        if len(text) > self.max_characters:
+            return TextProfile(text)
+        with self.__lock:
+            profile = self.__profiles.get(text)
+            if profile is None:
+                profile = self.__profiles[text] = TextProfile(text)
+                self.__characters += len(text)
+                while len(self.__profiles) > self.maxsize or self.__characters > self.max_characters:
+                    evicted, _ = self.__profiles.popitem(last=False)
+                    self.__characters -= len(evicted)
+            else:
+                self.__profiles.move_to_end(text)
+            return profile
+
+
+class FeatureEngine:
+    """
+    Computes the lexical, vocabulary richness and readability features of a list of texts
+    from one TextProfile per text, so every text is tokenized once and its frequency table
+    and syllables are shared by all the features. select() computes only the named features
+    and the intermediate nodes they depend on.
+
+    With n_jobs > 1 (or -1 for every core) the texts are split into chunks of similar length
+    that are computed in a process pool, unless the input is too small to be worth it. Pass a
+    ProfileCache to reuse the profiles of texts seen by other engines.
+
+    LexicalFeatures, VocabularyRichnessFeatures and ReadabilityScores build their own engine
+    by default; pass them the same engine to share the tokenization of the texts.
+    """
+
+    def __init__(self, texts, n_jobs=1, cache=None):
+        self.texts = texts
+        self.n_jobs = n_jobs
+        self.cache = cache
 
+    @cached_property
+    def profiles(self):
+        if self.cache is not None:
+            return [self.cache.profile(text) for text in self.texts]
+        return [TextProfile(text) for text in self.texts]
 
-class LexicalFeatures:
+    def lexical_features(self):
+        return self.select(LEXICAL_FEATURES)
+
+    def vocabulary_richness_features(self):
+        return self.select(VOCABULARY_RICHNESS_FEATURES)
+
+    def readability_scores(self):
+        return self.select(READABILITY_FEATURES)
+
+    def compute_features(self):
+        """All the columns of the three feature groups, Shannon Entropy only once."""
+        return self.select(FEATURES)
+
+    def select(self, features):
+        """A frame with only the given feature columns, in the given order."""
+        features = list(features)
+        required_nodes(features)
+        chunks = parallel.split(self.texts, self.n_jobs)
+        if len(chunks) == 1:
+            return self._select(features)
+        frames = parallel.map_chunks(functools.partial(_select_chunk, features), chunks, self.n_jobs)
+        return pd.concat(frames, ignore_index=True)
+
+    def _select(self, features):
+        return pd.DataFrame({feature: [profile[feature] for profile in self.profiles] for feature in features},
+                            columns=features)
+
+
+def _select_chunk(features, texts):
+    return FeatureEngine(texts)._select(features)
+
+
+class VectorizedFeatureEngine:
+    """
+    Same features as FeatureEngine for a pandas Series, list or Arrow array of texts, computed
+    with pandas string methods and NumPy arithmetic over per-text aggregates instead of a
+    Python loop per text. The values match FeatureEngine up to floating point rounding, except
+    that for a text without Arabic words Honore's R, Sichel's measure, Brunet's W and Yule's K,
+    for which the scalar path raises ZeroDivisionError, are NaN. Shannon entropy and Simpson's
+    index are 0 for such a text, as in the scalar path.
+    """
 
     def __init__(self, texts):
+        if hasattr(texts, 'to_pandas'):
+            texts = texts.to_pandas()
+        # object dtype keeps the string methods on Python's re, the Arrow string dtype would use RE2
+        self.texts = pd.Series(texts, dtype=object).reset_index(drop=True)
+
+    @cached_property
+    def words(self):
+        """Every Arabic word of every text, indexed by the position of its text."""
+        return self.texts.str.findall(text_kernel.ARABIC_WORD_RE).explode().dropna()
+
+    @cached_property
+    def word_counts(self):
+        """Word count, total length, syllables, complex and functional words per text."""
+        words = self.words
+        syllables = words.str.count('[%s]' % VOWELS)
+        counts = pd.DataFrame({'words': 1, 'length': words.str.len(), 'syllables': syllables,
+                               'complex': syllables > 2, 'functional': words.isin(FUNCTIONAL_WORDS)},
+                              index=words.index)
+        return counts.groupby(level=0).sum().reindex(self.texts.index, fill_value=0).astype(np.int64)
+
+    @cached_property
+    def frequency_counts(self):
+        """Types, hapaxes, sum of squared frequencies, entropy and Simpson's index per text."""
+        words = self.words
+        freq = pd.DataFrame({'text': words.index, 'word': words.to_numpy()}).groupby(['text', 'word'],
+                                                                                     sort=False).size()
+        text = freq.index.get_level_values('text')
+        f = freq.to_numpy(dtype=np.float64)
+        p = f / self.word_counts['words'].to_numpy()[text]
+        counts = pd.DataFrame({'types': 1, 'V1': f == 1, 'V2': f == 2, 'squares': f ** 2,
+                               'entropy': -p * np.log(p), 'simpson': p ** 2}, index=text)
+        return counts.groupby(level=0).sum().reindex(self.texts.index, fill_value=0)
+
+    @cached_property
+    def sentence_counts(self):
+        """Number of sentences and their total length per text, from the shared sentence splitter."""
+        spans = self.texts.map(text_kernel.sentence_spans)
+        return pd.DataFrame({'sentences': spans.map(len).astype(np.int64),
+                             'characters': spans.map(lambda sentences: sum(end - start for start, end in sentences))
+                             .astype(np.int64)})
+
+    def lexical_features(self):
+        counts = self.word_counts
+        N = counts['words'].to_numpy()
+        sentences = self.sentence_counts['sentences'].to_numpy()
+        sentence_characters = self.sentence_counts['characters'].to_numpy()
+
+        return pd.DataFrame({
+            "Average Word Length": _ratio(counts['length'].to_numpy(), N),
+            "Average Sentence Length By Word": _ratio(N, sentences),
+            "Average Sentence Length By Character": _ratio(sentence_characters, sentences),
+            "Special Character Count": self.texts.str.count(text_kernel.SPECIAL_CHARACTER_RE).to_numpy(),
+            "Average Syllable per Word": _ratio(counts['syllables'].to_numpy(), N),
+            "Functional Words Count": counts['functional'].to_numpy(),
+            "Punctuation Count": self.texts.str.count(r'[.،!?؛:]').to_numpy()
+        })
+
+    def vocabulary_richness_features(self):
+        N = self.word_counts['words'].to_numpy().astype(np.float64)
+        freq = self.frequency_counts
+        with np.errstate(divide='ignore', invalid='ignore'):
+            N = np.where(N > 0, N, np.nan)
+            return pd.DataFrame({
+                "Hapax Legomenon": freq['V1'].to_numpy(),
+                "Hapax DisLegemena": freq['V2'].to_numpy(),
+                "Honores R Measure": freq['V1'].to_numpy() / N,
+                "Sichel’s Measure": freq['V2'].to_numpy() / N,
+                "Brunet’s Measure W": (freq['types'].to_numpy() - 0.17) / np.log(N + 1),
+                "Yule’s Characteristic K": 10000 * (freq['squares'].to_numpy() - N) / N ** 2,
+                "Shannon Entropy": freq['entropy'].to_numpy(),
+                "Simpson’s Index": freq['simpson'].to_numpy()
+            })
+
+    def readability_scores(self):
+        counts = self.word_counts
+        freq = self.frequency_counts
+        N = counts['words'].to_numpy()
+        sentences = self.sentence_counts['sentences'].to_numpy()
+        scored = (N > 0) & (sentences > 0)
+
+        words_per_sentence = _ratio(N, sentences)
+        syllables_per_word = _ratio(counts['syllables'].to_numpy(), N)
+        complex_share = _ratio(counts['complex'].to_numpy(), N)
+        difficult_share = _ratio(N - counts['functional'].to_numpy(), N)
+
+        # Simplified formulas adapted for Arabic
+        return pd.DataFrame({
+            "Flesch Reading Ease": np.where(
+                scored, 206.835 - (1.015 * words_per_sentence) - (84.6 * syllables_per_word), 0),
+            "Flesch-Kincaid Grade Level": np.where(
+                scored, (0.39 * words_per_sentence) + (11.8 * syllables_per_word) - 15.59, 0),
+            "Gunning Fog Index": np.where(scored, 0.4 * (words_per_sentence + 100 * complex_share), 0),
+            "Dale Chall Readability Formula": np.where(
+                scored, 0.1579 * (difficult_share * 100) + 0.0496 * words_per_sentence, 0),
+            "Shannon Entropy": freq['entropy'].to_numpy(),
+            "Simpson's Index": freq['simpson'].to_numpy()
+        })
+
+    def compute_features(self):
+        """All the columns of the three feature groups, Shannon Entropy only once."""
+        return self.select(FEATURES)
+
+    def select(self, features):
+        """
+        A frame with only the given feature columns, in the given order. Only the feature
+        groups that contain them are computed, the per-text aggregates being shared.
+        """
+        features = list(features)
+        groups = [(LEXICAL_FEATURES, self.lexical_features), (VOCABULARY_RICHNESS_FEATURES,
+                  self.vocabulary_richness_features), (READABILITY_FEATURES, self.readability_scores)]
+        columns = {}
+        for group, compute in groups:
+            missing = [feature for feature in features if feature in group and feature not in columns]
+            if missing:
+                frame = compute()
+                columns.update((feature, frame[feature]) for feature in missing)
+        unknown = [feature for feature in features if feature not in columns]
+        if unknown:
+            raise Exception('Unknown feature %s' % unknown[0])
+        return pd.DataFrame(columns, columns=features)
+
+
+def _ratio(numerator, denominator):
+    """numerator / denominator element-wise, 0 where the denominator is 0."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator > 0, numerator / denominator, 0)
+
+
+def _shannon_entropy(freq, N):
+    return -sum((f / N) * math.log(f / N) for f in freq.values())
+
+
+def _simpsons_index(freq, N):
+    return sum((f / N) ** 2 for f in freq.values())
+
+
+class LexicalFeatures:
+
+    def __init__(self, texts, engine=None, n_jobs=1):
         self.texts = texts
+        self.engine = engine if engine is not None else FeatureEngine(texts, n_jobs=n_jobs)
 
     def tokenize_words(self, text):
-        words = re.findall(r'\b\w+\b', text)
-        return [word for word in words if self.is_arabic(word)]
+        return text_kernel.arabic_words(text)
 
     def tokenize_sentences(self, text):
-        sentences = re.split(r'[.!?]', text)
-        return [sentence for sentence in sentences if sentence]
+        return text_kernel.split_sentences(text)
 
     def is_arabic(self, word):
-        return any('\u0600' <= char <= '\u06FF' for char in word)
+        return text_kernel.is_arabic(word)
 
     def average_word_length(self, words):
         if not words:
@@ -36,8 +409,7 @@ class LexicalFeatures:
         return sum(len(sentence) for sentence in sentences) / len(sentences)
 
     def special_character_count(self, text):
-        special_chars = re.findall(r'[^a-zA-Z0-9\s]', text)
-        return len(special_chars)
+        return text_kernel.count_special_characters(text)
 
     def average_syllable_per_word(self, words):
         if not words:
@@ -45,54 +417,29 @@ class LexicalFeatures:
         return sum(self.count_syllables(word) for word in words) / len(words)
 
     def count_syllables(self, word):
-        vowels = "aeiouAEIOU\u0627\u0648\u0649"
-        return sum(1 for char in word if char in vowels)
+        return text_kernel.count_syllables(word)
 
     def functional_words_count(self, words):
-        functional_words = {'في', 'من', 'إلى', 'على', 'أن', 'و', 'ب', 'ل', 'ك', 'التي', 'الذي', 'عن'}
-        return sum(1 for word in words if word in functional_words)
+        return sum(1 for word in words if text_kernel.is_functional_word(word))
 
     def punctuation_count(self, text):
-        punctuation = re.findall(r'[.،!?؛:]', text)
-        return len(punctuation)
+        return text_kernel.count_punctuation(text)
 
     def compute_features(self):
-        data = {
-            "Average Word Length": [],
-            "Average Sentence Length By Word": [],
-            "Average Sentence Length By Character": [],
-            "Special Character Count": [],
-            "Average Syllable per Word": [],
-            "Functional Words Count": [],
-            "Punctuation Count": []
-        }
-
-        for text in self.texts:
-            words = self.tokenize_words(text)
-            sentences = self.tokenize_sentences(text)
-
-            data["Average Word Length"].append(self.average_word_length(words))
-            data["Average Sentence Length By Word"].append(self.average_sentence_length_by_word(sentences))
-            data["Average Sentence Length By Character"].append(self.average_sentence_length_by_character(sentences))
-            data["Special Character Count"].append(self.special_character_count(text))
-            data["Average Syllable per Word"].append(self.average_syllable_per_word(words))
-            data["Functional Words Count"].append(self.functional_words_count(words))
-            data["Punctuation Count"].append(self.punctuation_count(text))
-
-        return pd.DataFrame(data)
+        return self.engine.lexical_features()
 
 
 class VocabularyRichnessFeatures:
 
-    def __init__(self, texts):
+    def __init__(self, texts, engine=None, n_jobs=1):
         self.texts = texts
+        self.engine = engine if engine is not None else FeatureEngine(texts, n_jobs=n_jobs)
 
     def tokenize_words(self, text):
-        words = re.findall(r'\b\w+\b', text)
-        return [word for word in words if self.is_arabic(word)]
+        return text_kernel.arabic_words(text)
 
     def is_arabic(self, word):
-        return any('\u0600' <= char <= '\u06FF' for char in word)
+        return text_kernel.is_arabic(word)
 
     def hapax_legomena(self, words):
         freq = Counter(words)
@@ -134,51 +481,26 @@ class VocabularyRichnessFeatures:
         return sum((f / N) ** 2 for f in freq.values())
 
     def compute_features(self):
-        data = {
-            "Hapax Legomenon": [],
-            "Hapax DisLegemena": [],
-            "Honores R Measure": [],
-            "Sichel’s Measure": [],
-            "Brunet’s Measure W": [],
-            "Yule’s Characteristic K": [],
-            "Shannon Entropy": [],
-            "Simpson’s Index": []
-        }
-
-        for text in self.texts:
-            words = self.tokenize_words(text)
-
-            data["Hapax Legomenon"].append(self.hapax_legomena(words))
-            data["Hapax DisLegemena"].append(self.hapax_dislegomena(words))
-            data["Honores R Measure"].append(self.honores_r_measure(words))
-            data["Sichel’s Measure"].append(self.sichel_measure(words))
-            data["Brunet’s Measure W"].append(self.brunets_measure_w(words))
-            data["Yule’s Characteristic K"].append(self.yules_characteristic_k(words))
-            data["Shannon Entropy"].append(self.shannon_entropy(words))
-            data["Simpson’s Index"].append(self.simpsons_index(words))
-
-        return pd.DataFrame(data)
+        return self.engine.vocabulary_richness_features()
 
 
 class ReadabilityScores:
 
-    def __init__(self, texts):
+    def __init__(self, texts, engine=None, n_jobs=1):
         self.texts = texts
+        self.engine = engine if engine is not None else FeatureEngine(texts, n_jobs=n_jobs)
 
     def tokenize_words(self, text):
-        words = re.findall(r'\b\w+\b', text)
-        return [word for word in words if self.is_arabic(word)]
+        return text_kernel.arabic_words(text)
 
     def tokenize_sentences(self, text):
-        sentences = re.split(r'[.!؟]', text)
-        return [sentence for sentence in sentences if sentence]
+        return text_kernel.split_sentences(text)
 
     def is_arabic(self, word):
-        return any('\u0600' <= char <= '\u06FF' for char in word)
+        return text_kernel.is_arabic(word)
 
     def syllable_count(self, word):
-        vowels = "aeiouAEIOU\u0627\u0648\u0649"
-        return sum(1 for char in word if char in vowels)
+        return text_kernel.count_syllables(word)
 
     def flesch_reading_ease(self, words, sentences):
         word_count = len(words)
@@ -235,8 +557,7 @@ class ReadabilityScores:
 
     def is_common_word(self, word):
         # This is a simple heuristic. A more accurate list of common Arabic words can be used.
-        common_words = {'في', 'من', 'إلى', 'على', 'أن', 'و', 'ب', 'ل', 'ك', 'التي', 'الذي', 'عن'}
-        return word in common_words
+        return text_kernel.is_functional_word(word)
 
     def shannon_entropy(self, words):
         freq = Counter(words)
@@ -249,25 +570,5 @@ class ReadabilityScores:
         return sum((f / N) ** 2 for f in freq.values())
 
     def compute_features(self):
-        data = {
-            "Flesch Reading Ease": [],
-            "Flesch-Kincaid Grade Level": [],
-            "Gunning Fog Index": [],
-            "Dale Chall Readability Formula": [],
-            "Shannon Entropy": [],
-            "Simpson's Index": []
-        }
-
-        for text in self.texts:
-            words = self.tokenize_words(text)
-            sentences = self.tokenize_sentences(text)
-
-            data["Flesch Reading Ease"].append(self.flesch_reading_ease(words, sentences))
-            data["Flesch-Kincaid Grade Level"].append(self.flesch_kincaid_grade_level(words, sentences))
-            data["Gunning Fog Index"].append(self.gunning_fog_index(words, sentences))
-            data["Dale Chall Readability Formula"].append(self.dale_chall_readability_formula(words, sentences))
-            data["Shannon Entropy"].append(self.shannon_entropy(words))
-            data["Simpson's Index"].append(self.simpsons_index(words))
-
-        return pd.DataFrame(data)
+        return self.engine.readability_scores()
 
@@ -0,0 +1,238 @@
+"""
+Bounded-memory, mergeable sketches for corpus vocabulary statistics.
+
+Every sketch hashes words with an unkeyed 128 bit BLAKE2b digest, so the hashes are the same
+in every process and sketches built on separate shards can be merged, provided they were
+created with the same parameters. Error bounds, with N the number of words added:
+
+- HyperLogLog(p): vocabulary size with a relative standard error of 1.04 / sqrt(2 ** p),
+  0.81% for the default p=14, in 2 ** p bytes.
+- CountMinSketch(epsilon, delta): a word frequency f is estimated as f_hat with
+  f <= f_hat <= f + epsilon * N with probability at least 1 - delta, in
+  ceil(e / epsilon) * ceil(ln(1 / delta)) counters.
+- FrequentItems(k) (Misra-Gries): keeps at most 2k words, every word with a frequency above
+  N / (k + 1) is kept and its count c satisfies f - N / (k + 1) <= c <= f.
+- DistinctSample(capacity): every distinct word is kept with its exact frequency with
+  probability 2 ** -level, the level rising as needed to keep at most `capacity` words. A
+  count over the sampled words divided by that probability estimates the same count over
+  all the words without bias, with a relative standard error close to 1 / sqrt(number of
+  sampled words counted), e.g. about 1% when 10,000 sampled words are hapaxes.
+
+CorpusVocabularySketch combines them to estimate the VocabularyRichnessFeatures measures of a
+whole corpus: N is exact, the vocabulary comes from HyperLogLog, V1 and V2 from the distinct
+sample, and the sums of squared frequencies and of f * log(f) add the Count-Min frequencies of
+the frequent words to the distinct sample estimate over the other words.
+"""
+import functools
+import hashlib
+import math
+from collections import Counter
+
+import numpy as np
+
+from .readability_analysis import TextProfile
+
+
+@functools.lru_cache(maxsize=65536)
+def word_hashes(word):
+    """Two independent 64 bit hashes of a word."""
+    digest = hashlib.blake2b(word.encode('utf-8'), digest_size=16).digest()
+    return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little')
+
+
+class HyperLogLog:
+    """Estimates the number of distinct hashes added."""
+
+    def __init__(self, p=14):
+        if not 4 <= p <= 18:
+            raise Exception('The precision must be between 4 and 18')
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+
+    def add_hash(self, h):
+        index = h >> (64 - self.p)
+        rest = h & ((1 << (64 - self.p)) - 1)
+        rank = 64 - self.p - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        if other.p != self.p:
+            raise Exception('Cannot merge HyperLogLog sketches of different precisions')
+        self.registers = bytearray(np.maximum(np.frombuffer(self.registers, dtype=np.uint8),
+                                              np.frombuffer(other.registers, dtype=np.uint8)).tobytes())
+        return self
+
+    def estimate(self):
+        registers = np.frombuffer(self.registers, dtype=np.uint8)
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m ** 2 / np.sum(np.ldexp(1.0, -registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(registers == 0))
+        # small cardinalities are better estimated by linear counting of the empty registers
+        if estimate <= 2.5 * self.m and zeros:
+            estimate = self.m * math.log(self.m / zeros)
+        return float(estimate)
+
+
+class CountMinSketch:
+    """Frequency estimates that never undercount, see the module docstring for the bound."""
+
+    def __init__(self, epsilon=1e-4, delta=0.01):
+        self.epsilon = epsilon
+        self.delta = delta
+        self.width = math.ceil(math.e / epsilon)
+        self.depth = math.ceil(math.log(1 / delta))
+        self.table = np.zeros((self.depth, self.width), dtype=np.int64)
+
+    def __columns(self, h):
+        # Kirsch-Mitzenmacher: depth hash functions from the two halves of one 64 bit hash
+        h1, h2 = h & 0xFFFFFFFF, h >> 32
+        return [(h1 + i * h2) % self.width for i in range(self.depth)]
+
+    def add_hash(self, h, count=1):
+        self.table[np.arange(self.depth), self.__columns(h)] += count
+
+    def estimate_hash(self, h):
+        return int(self.table[np.arange(self.depth), self.__columns(h)].min())
+
+    def merge(self, other):
+        if other.table.shape != self.table.shape:
+            raise Exception('Cannot merge Count-Min sketches of different sizes')
+        self.table += other.table
+        return self
+
+
+class FrequentItems:
+    """Misra-Gries summary of the most frequent words, mergeable as in Agarwal et al. (2012)."""
+
+    def __init__(self, k=1000):
+        self.k = k
+        self.counters = {}
+
+    def add(self, word, count=1):
+        self.counters[word] = self.counters.get(word, 0) + count
+        if len(self.counters) > 2 * self.k:
+            self.__reduce()
+
+    def merge(self, other):
+        for word, count in other.counters.items():
+            self.counters[word] = self.counters.get(word, 0) + count
+        self.__reduce()
+        return self
+
+    def __reduce(self):
+        # subtracting the (k+1)-th largest count keeps at most k words and undercounts
+        # every word by at most N / (k + 1) in total
+        if len(self.counters) <= self.k:
+            return
+        cut = sorted(self.counters.values(), reverse=True)[self.k]
+        self.counters = {word: count - cut for word, count in self.counters.items() if count > cut}
+
+
+class DistinctSample:
+    """Exact frequencies of a hash-sampled subset of the distinct words."""
+
+    def __init__(self, capacity=65536):
+        self.capacity = capacity
+        self.level = 0
+        self.counts = {}
+
+    @property
+    def rate(self):
+        return 2.0 ** -self.level
+
+    def __sampled(self, h):
+        return h & ((1 << self.level) - 1) == 0
+
+    def add_hash(self, word, h, count=1):
+        # the level only rises, so a sampled word has been counted since its first occurrence
+        if self.__sampled(h):
+            self.counts[word] = self.counts.get(word, 0) + count
+            if len(self.counts) > self.capacity:
+                self.__shrink()
+
+    def merge(self, other):
+        self.level = max(self.level, other.level)
+        for word, count in other.counts.items():
+            self.counts[word] = self.counts.get(word, 0) + count
+        self.counts = {word: count for word, count in self.counts.items()
+                       if self.__sampled(word_hashes(word)[1])}
+        self.__shrink()
+        return self
+
+    def __shrink(self):
+        while len(self.counts) > self.capacity:
+            self.level += 1
+            self.counts = {word: count for word, count in self.counts.items()
+                           if self.__sampled(word_hashes(word)[1])}
+
+
+class CorpusVocabularySketch:
+    """
+    Approximate vocabulary size and vocabulary richness measures of a corpus too large for an
+    exact Counter, in memory bounded by the sketch parameters. Build one per shard with the
+    same parameters, then merge them.
+    """
+
+    def __init__(self, p=14, epsilon=1e-4, delta=0.01, k=1000, capacity=65536):
+        self.N = 0
+        self.hyperloglog = HyperLogLog(p)
+        self.count_min = CountMinSketch(epsilon, delta)
+        self.frequent = FrequentItems(k)
+        self.sample = DistinctSample(capacity)
+
+    def update(self, text):
+        """Adds the Arabic words of a text, tokenized as in VocabularyRichnessFeatures."""
+        self.update_words(TextProfile(text).words)
+        return self
+
+    def update_words(self, words):
+        # every distinct word of the batch is hashed and added once with its count
+        for word, count in Counter(words).items():
+            h, sample_h = word_hashes(word)
+            self.N += count
+            self.hyperloglog.add_hash(h)
+            self.count_min.add_hash(h, count)
+            self.frequent.add(word, count)
+            self.sample.add_hash(word, sample_h, count)
+        return self
+
+    def merge(self, other):
+        self.N += other.N
+        self.hyperloglog.merge(other.hyperloglog)
+        self.count_min.merge(other.count_min)
+        self.frequent.merge(other.frequent)
+        self.sample.merge(other.sample)
+        return self
+
+    def vocabulary(self):
+        return self.hyperloglog.estimate()
+
+    def frequency(self, word):
+        return self.count_min.estimate_hash(word_hashes(word)[0])
+
+    def compute_features(self):
+        """The estimated measures under the VocabularyRichnessFeatures column names."""
+        N = self.N
+        rate = self.sample.rate
+        heavy = {word: self.frequency(word) for word in self.frequent.counters}
+        tail = [count for word, count in self.sample.counts.items() if word not in heavy]
+
+        V1 = sum(1 for count in self.sample.counts.values() if count == 1) / rate
+        V2 = sum(1 for count in self.sample.counts.values() if count == 2) / rate
+        squares = sum(f ** 2 for f in heavy.values()) + sum(f ** 2 for f in tail) / rate
+        f_log_f = sum(f * math.log(f) for f in heavy.values() if f) + sum(f * math.log(f) for f in tail) / rate
+
+        return {
+            "Words": N,
+            "Vocabulary": self.vocabulary(),
+            "Hapax Legomenon": V1,
+            "Hapax DisLegemena": V2,
+            "Honores R Measure": V1 / N,
+            "Sichel’s Measure": V2 / N,
+            "Brunet’s Measure W": (self.vocabulary() - 0.17) / math.log(N + 1),
+            "Yule’s Characteristic K": 10000 * (squares - N) / N ** 2,
+            "Shannon Entropy": math.log(N) - f_log_f / N,
+            "Simpson’s Index": squares / N ** 2
+        }
@@ -0,0 +1,132 @@
+"""
+Text primitives shared by the text statistics and the readability features.
+
+Arabic detection, word extraction and character counting run on precompiled regular
+expressions, str.count and str.translate tables, so that the scanning happens in C instead of
+a Python loop per character. Syllable counts are memoized per word in a bounded LRU cache, which
+pays off because word frequencies are heavily skewed.
+"""
+import functools
+import re
+
+ARABIC_RANGE = '\u0600-\u06FF'
+FUNCTIONAL_WORDS = frozenset({'في', 'من', 'إلى', 'على', 'أن', 'و', 'ب', 'ل', 'ك', 'التي', 'الذي', 'عن'})
+VOWELS = "aeiouAEIOU\u0627\u0648\u0649"
+# Upper bound on the number of words kept by the syllable memo
+MEMO_SIZE = 1 << 16
+
+ARABIC_CHAR_RE = re.compile('[%s]' % ARABIC_RANGE)
+ARABIC_RUN_RE = re.compile('[%s]+' % ARABIC_RANGE)
+WORD_RE = re.compile(r'\b\w+\b')
+# A maximal run of word characters with at least one Arabic word character in it, the same
+# tokens as WORD_RE filtered with is_arabic
+ARABIC_WORD_RE = re.compile(r'\b\w*(?=[%s])\w+\b' % ARABIC_RANGE)
+# A maximal run of non space characters with at least one Arabic character in it. The match
+# only starts at the beginning of a token, unanchored it would rescan a long token without
+# Arabic from each of its characters, quadratic in the length of the token
+ARABIC_TOKEN_RE = re.compile(r'(?<!\S)\S*[%s]\S*' % ARABIC_RANGE)
+# End of a sentence: a run of terminators with the closing quotes or brackets after it, when
+# it is followed by a space, the end of the text or a letter (so a number like 3.5 is not split),
+# or a line break. The Arabic comma and semicolon separate clauses, not sentences.
+SENTENCE_TERMINATORS = '.!?\u061F\u2026'
+SENTENCE_BOUNDARY_RE = re.compile(r'[%s]+[\'"\u00BB\u201D\u2019)\]]*(?=\s|$|[^\W\d_])|\n' % SENTENCE_TERMINATORS)
+# Number of recent texts whose sentence offsets are kept, so the text statistics and the
+# features of the same text share one segmentation
+SENTENCE_MEMO_SIZE = 64
+_WORD_CHAR_RE = re.compile(r'\w')
+_NON_SPACE_RE = re.compile(r'\S')
+SPECIAL_CHARACTER_RE = re.compile(r'[^a-zA-Z0-9\s]')
+PUNCTUATION = '.،!?؛:'
+
+_DELETE_VOWELS = dict.fromkeys(map(ord, VOWELS))
+
+
+class _ArabicOnlyTable(dict):
+    """str.translate table that keeps the Arabic characters (and optionally whitespace) and deletes the rest."""
+
+    def __init__(self, keep_whitespace=False):
+        super().__init__()
+        self.keep_whitespace = keep_whitespace
+
+    def __missing__(self, code):
+        keep = 0x0600 <= code <= 0x06FF or (self.keep_whitespace and chr(code).isspace())
+        self[code] = code if keep else None
+        return self[code]
+
+
+_KEEP_ARABIC = _ArabicOnlyTable()
+_KEEP_ARABIC_AND_WHITESPACE = _ArabicOnlyTable(keep_whitespace=True)
+
+
+def is_arabic(word):
+    return ARABIC_CHAR_RE.search(word) is not None
+
+
+def arabic_words(text):
+    """The \\b\\w+\\b words of the text that contain an Arabic character."""
+    return ARABIC_WORD_RE.findall(text)
+
+
+def keep_arabic(text):
+    """The text with every non Arabic character removed."""
+    return text.translate(_KEEP_ARABIC)
+
+
+def arabic_tokens(text):
+    """The whitespace separated tokens of the text that contain Arabic, stripped to their Arabic characters."""
+    return text.translate(_KEEP_ARABIC_AND_WHITESPACE).split()
+
+
+def count_arabic_tokens(text):
+    return len(ARABIC_TOKEN_RE.findall(text))
+
+
+def count_arabic_characters(text):
+    # matching runs of Arabic characters beats a per character translate table on long texts
+    return sum(map(len, ARABIC_RUN_RE.findall(text)))
+
+
+def count_punctuation(text):
+    return sum(text.count(mark) for mark in PUNCTUATION)
+
+
+def count_special_characters(text):
+    return len(SPECIAL_CHARACTER_RE.findall(text))
+
+
+@functools.lru_cache(maxsize=MEMO_SIZE)
+def count_syllables(word):
+    return len(word) - len(word.translate(_DELETE_VOWELS))
+
+
+def is_functional_word(word):
+    # a frozenset lookup is already a single hash probe, a memo in front of it would only add one
+    return word in FUNCTIONAL_WORDS
+
+
+@functools.lru_cache(maxsize=SENTENCE_MEMO_SIZE)
+def sentence_spans(text):
+    """
+    (start, end) offsets of the sentences of the text, without their surrounding whitespace.
+    Pieces without any word character (a lone "..." or an emoji line) are not sentences.
+    """
+    spans = []
+    start = 0
+    for boundary in SENTENCE_BOUNDARY_RE.finditer(text):
+        _add_sentence(text, start, boundary.end(), spans)
+        start = boundary.end()
+    _add_sentence(text, start, len(text), spans)
+    return tuple(spans)
+
+
+def _add_sentence(text, start, end, spans):
+    if _WORD_CHAR_RE.search(text, start, end) is None:
+        return
+    start = _NON_SPACE_RE.search(text, start, end).start()
+    while text[end - 1].isspace():
+        end -= 1
+    spans.append((start, end))
+
+
+def split_sentences(text):
+    return [text[start:end] for start, end in sentence_spans(text)]
@@ -1,59 +1,27 @@
-import nltk
+import functools
+import itertools
 import pandas as pd
 
+from . import parallel, text_kernel
 
-def total_arabic_word_count(text):
-    # Remove punctuation marks and split the text into words
-    words = text.split()
-    # Initialize a counter for the total number of words
-    total_count = 0
-
-    # Iterate through each word
-    for word in words:
-        # Remove any non-Arabic characters (e.g., English words, numbers, etc.)
-        cleaned_word = ''.join(c for c in word if '\u0600' <= c <= '\u06FF' or c == ' ')
 
-        # Increment the total count if the cleaned word is not empty
-        if cleaned_word.strip():
-            total_count += 1
-
-    return total_count
+def total_arabic_word_count(text):
+    # Whitespace separated tokens with at least one Arabic character (English words, numbers, etc. don't count)
+    return text_kernel.count_arabic_tokens(text)
 
 
 def total_arabic_character_count(text):
-    # Initialize a counter for the total number of Arabic characters
-    total_count = 0
-    # Iterate through each character in the text
-    for char in text:
-        # Check if the character is Arabic
-        if '\u0600' <= char <= '\u06FF':
-            total_count += 1
-    return total_count
+    return text_kernel.count_arabic_characters(text)
 
 
 def count_sentences(text):
-    sentences = nltk.sent_tokenize(text)
-    return len(sentences)
+    # Same sentences as the readability features
+    return len(text_kernel.sentence_spans(text))
 
 
 def calculate_arabic_vocabulary(text):
-    # Tokenize the text into words
-    words = text.split()
-
-    # Initialize a set to store unique Arabic words
-    arabic_words = set()
-
-    # Iterate through each word
-    for word in words:
-        # Remove any non-Arabic characters (e.g., English words, numbers, etc.)
-        cleaned_word = ''.join(c for c in word if '\u0600' <= c <= '\u06FF')
-
-        # Add the cleaned Arabic word to the set if it's not empty
-        if cleaned_word.strip():
-            arabic_words.add(cleaned_word)
-
-    # Return the size of the Arabic vocabulary
-    return len(arabic_words)
+    # Unique tokens once stripped of their non-Arabic characters (English words, numbers, etc.)
+    return len(set(text_kernel.arabic_tokens(text)))
 
 
 def convert_to_preferred_format(sec):
@@ -66,50 +34,72 @@ def convert_to_preferred_format(sec):
 
 
 def speech_speed_text(text):
-    number_word = total_arabic_word_count(text)
-    return convert_to_preferred_format((number_word / 125) * 100)
+    return _speech_speed(total_arabic_word_count(text))
 
 
 def read_speed_text(text):
-    number_word = total_arabic_word_count(text)
+    return _read_speed(total_arabic_word_count(text))
+
+
+def _speech_speed(number_word):
+    return convert_to_preferred_format((number_word / 125) * 100)
+
+
+def _read_speed(number_word):
     return convert_to_preferred_format((number_word / 200) * 100)
 
 
-def show_text_statistics(texts):
-    texts = texts.to_list()
-    # Initialize an empty DataFrame with the appropriate column names
-    columns = ['Text', 'Words', 'Characters', 'Sentence Count', 'Vocabulary',
-               'Speech Speed', 'Read Speed']
-    statistics = pd.DataFrame(columns=columns)
-    statistics.style.set_properties(**{'text-align': 'left'})
-
-    if isinstance(texts, list):
-        for text in texts:
-            # Collect the statistics for the current text
-            data = [
-                text,
-                total_arabic_word_count(text),
-                total_arabic_character_count(text),
-                count_sentences(text),
-                calculate_arabic_vocabulary(text),
-                speech_speed_text(text),
-                read_speed_text(text)
-            ]
-            # Append the data as a new row to the DataFrame
-            statistics.loc[len(statistics)] = data
-    else:
-        # Collect the statistics for the single text
-        data = [
-            texts,
-            total_arabic_word_count(texts),
-            total_arabic_character_count(texts),
-            count_sentences(texts),
-            calculate_arabic_vocabulary(texts),
-            speech_speed_text(texts),
-            read_speed_text(texts)
-        ]
-        # Append the data as a new row to the DataFrame
-        statistics.loc[len(statistics)] = data
-
-    # Display the DataFrame
-    return statistics
+def show_text_statistics(texts, n_jobs=1, include_text=True):
+    # A single text is accepted too
+    if isinstance(texts, str):
+        texts = [texts]
+    texts = texts.to_list() if hasattr(texts, 'to_list') else list(texts)
+    # Large inputs are split into chunks computed in a pool of n_jobs processes
+    chunks = parallel.split(texts, n_jobs)
+    if len(chunks) > 1:
+        frames = parallel.map_chunks(functools.partial(_text_statistics_chunk, include_text=include_text),
+                                     chunks, n_jobs)
+        return pd.concat(frames, ignore_index=True)
+    return _text_statistics_chunk(texts, include_text)
+
+
+def iter_text_statistics(texts, chunk_size=10000, n_jobs=1, include_text=False):
+    """
+    Yields the statistics of an iterable of texts (a Series, a list, a generator over a file...)
+    as one DataFrame per chunk_size texts, indexed by the position of the texts. At most two
+    chunks per process are in flight at a time, so memory stays bounded whatever the number of
+    texts. The text itself is left out by default.
+    """
+    chunks = _iter_chunks(texts, chunk_size)
+    offset = 0
+    for statistics in parallel.imap_chunks(functools.partial(_text_statistics_chunk, include_text=include_text),
+                                           chunks, n_jobs):
+        statistics.index = pd.RangeIndex(offset, offset + len(statistics))
+        offset += len(statistics)
+        yield statistics
+
+
+def _iter_chunks(texts, chunk_size):
+    texts = iter(texts)
+    while True:
+        chunk = list(itertools.islice(texts, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _text_statistics_chunk(texts, include_text=True):
+    # Every statistic is computed once per text and the frame is built column by column
+    words = [total_arabic_word_count(text) for text in texts]
+    statistics = {
+        'Text': texts,
+        'Words': words,
+        'Characters': [total_arabic_character_count(text) for text in texts],
+        'Sentence Count': [count_sentences(text) for text in texts],
+        'Vocabulary': [calculate_arabic_vocabulary(text) for text in texts],
+        'Speech Speed': [_speech_speed(number_word) for number_word in words],
+        'Read Speed': [_read_speed(number_word) for number_word in words]
+    }
+    if not include_text:
+        del statistics['Text']
+    return pd.DataFrame(statistics, columns=list(statistics))
@@ -1 +1 @@
-from .aranet import AraAna
\ No newline at end of file
+from .aranet import AraAna, AraAnaMultiTask, Predictions
@@ -1,22 +1,34 @@
 # encoding: utf-8
 import optparse
+import itertools
 import os, json
+import platform
+import threading
+import time
+from collections import OrderedDict
 import numpy as np
 import pandas as pd
-from keras_preprocessing.sequence import pad_sequences
 import torch
 from torch import nn
-from torch.utils.data import DataLoader, TensorDataset
-from transformers import BertTokenizer, BertForSequenceClassification
+from transformers import BertTokenizerFast, BertModel
+
+from . import backends, streaming
+from .backends import missing_runtime
+
+# rules to combine the window probabilities of a long document
+AGGREGATES = ('mean', 'max', 'weighted')
 
 
 class AraAna():
     '''
     '''
 
-    def __init__(self, path):
-        # check if gpu is available
-        self.__device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    def __init__(self, path, backend='eager', cache_size=0, autotune=None, tuning_path=None, tuned_threads=False):
+        # check if gpu is available, the other backends only run on the CPU
+        if backend == 'eager':
+            self.__device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        else:
+            self.__device = torch.device("cpu")
         self.n___gpu = torch.cuda.device_count()
 
         # check if the path exists
@@ -31,108 +43,653 @@ class AraAna():
         if not os.path.exists(model_path):
             raise Exception("Couldn't find the path %s" % model_path)
 
-        # load the model
-        try:
-            self.__tokenizer = BertTokenizer.from_pretrained(model_path, do_lower_case=True)
-            self.__model = BertForSequenceClassification.from_pretrained(pretrained_model_name_or_path=model_path)
-
-            self.__model = self.__model.to(self.__device)
+        # check the backend
+        if backend not in backends.BACKENDS:
+            raise Exception('Unknown backend %s, expected one of %s' % (backend, ', '.join(backends.BACKENDS)))
+        self.__backend = backend
 
+        # load the model, exported backends are cached next to the model directory
+        try:
+            self.__tokenizer = BertTokenizerFast.from_pretrained(model_path, do_lower_case=True)
+            self.__forward = backends.load_backend(model_path, backend, os.path.join(self.__path, 'backends'),
+                                                   self.__device)
         except Exception as e:
             raise Exception("Couldn't load the model", e)
 
         # load the labels dictionary
-        dict_path = os.path.join(self.__path, 'labels-dict.json')
-        if not os.path.exists(dict_path):
-            raise Exception("Couldn't find the path %s" % dict_path)
-        with open(dict_path) as json_file:
-            self.__lab2ind = json.load(json_file)
-        self.__ind2lab = {}
-        for label in self.__lab2ind.keys():
-            self.__ind2lab[self.__lab2ind[label]] = label
+        self.__lab2ind, self.__ind2lab = _load_labels(self.__path)
+
+        # cache of predicted probabilities keyed on the model identity and the normalized text
+        self.__model_id = (os.path.abspath(self.__path), self.__backend)
+        self.__cache = _PredictionCache(cache_size) if cache_size > 0 else None
+
+        # batch token budget from a previous autotune on this host if there is one, the thread
+        # count is process wide so it is only applied when asked for with tuned_threads
+        self.__max_tokens = 5000
+        self.__tuning_path = tuning_path or os.path.join(self.__path, 'autotune.json')
+        tuned = _load_tuning(self.__tuning_path).get(_host_key(), {}).get(self.__backend)
+        if tuned is not None:
+            self.__max_tokens = tuned['max_tokens']
+            if tuned_threads:
+                torch.set_num_threads(tuned['threads'])
+        if autotune is not None:
+            self.autotune(autotune)
+
+    @property
+    def labels(self):
+        '''
+            The label vocabulary, in the order of the model outputs.
+        '''
+        return [self.__ind2lab[i] for i in range(len(self.__ind2lab))]
+
+    def cache_info(self):
+        '''
+            Returns the hits, misses, current size and maximum size of the prediction cache.
+        '''
+        if self.__cache is None:
+            return {'hits': 0, 'misses': 0, 'size': 0, 'maxsize': 0}
+        return self.__cache.info()
+
+    def predict(self, text=None, path=None, with_dist=False, max_tokens=None, long_document=False, stride=25,
+                aggregate='mean', columnar=False):
+        '''
+            Returns a list of (label, prob) tuples, or (label, prob, ((label, prob), ...)) tuples
+            with with_dist=True. With columnar=True a Predictions object holding NumPy arrays is
+            returned instead and no tuple is built.
+
+            By default every text is truncated to its first 50 tokens. With long_document=True
+            every text is split into windows of 50 tokens overlapping by `stride` tokens, the
+            windows of all texts are classified in shared batches, and the window probabilities
+            of a text are combined with the `aggregate` rule: 'mean', 'max' (per label maximum,
+            renormalized) or 'weighted' (mean weighted by the number of tokens in the window).
+        '''
+        sentences = _read_sentences(text=text, path=path)
+        return self.predict_sentences(sentences, with_dist=with_dist, max_tokens=max_tokens,
+                                      long_document=long_document, stride=stride, aggregate=aggregate,
+                                      columnar=columnar)
+
+    def predict_sentences(self, sentences, with_dist=False, max_tokens=None, long_document=False, stride=25,
+                          aggregate='mean', columnar=False):
+        '''
+            Same as predict, for a list of sentences already in memory.
+        '''
+        pred_probs = self.__predict_probs(sentences, max_tokens=max_tokens,
+                                          window=(stride, aggregate) if long_document else None)
+        if columnar:
+            return Predictions(pred_probs, self.labels)
+        return _format_results(pred_probs, self.__ind2lab, with_dist)
+
+    def predict_stream(self, path, output_path=None, checkpoint_path=None, chunk_size=10000, with_dist=False,
+                       max_tokens=None):
+        '''
+            Streams a one-sentence-per-line file through the model chunk by chunk and yields
+            the same results predict returns, one sentence at a time.
+
+            When output_path is given every chunk is appended to it as tab separated
+            `label, prob[, prob per label]` lines. When checkpoint_path is given the byte
+            offsets reached in the input and output files are saved once every result of a
+            chunk has been yielded, and a later call with the same paths resumes right after
+            the last saved chunk.
+        '''
+        state = streaming.load_checkpoint(checkpoint_path)
+        output_file = streaming.open_output(output_path, state['output_offset'])
+        try:
+            for input_offset, sentences in streaming.iter_chunks(path, chunk_size, state['input_offset']):
+                results = self.predict_sentences(sentences, with_dist=with_dist, max_tokens=max_tokens)
+
+                if output_file is not None:
+                    output_file.write(''.join(_format_line(result) for result in results).encode('utf-8'))
+                    output_file.flush()
+                    state['output_offset'] = output_file.tell()
+                state['input_offset'] = input_offset
+                state['count'] += len(results)
+
+                for result in results:
+                    yield result
+                # saved only once the whole chunk was consumed, so a consumer stopped in the middle
+                # of a chunk resumes from its first line
+                streaming.save_checkpoint(checkpoint_path, state)
+        finally:
+            if output_file is not None:
+                output_file.close()
+
+    def check_drift(self, sentences, backends=('torchscript', 'onnx', 'int8'), max_tokens=None):
+        '''
+            Compares every backend against eager PyTorch on the given sentences.
+
+            Returns a dictionary mapping every backend to the share of sentences that get the
+            same label as in eager mode and to the largest and mean absolute difference between
+            the predicted probabilities. A backend whose runtime package isn't installed is
+            skipped and mapped to {'skipped': <reason>} instead.
+        '''
+        reference = self if self.__backend == 'eager' else AraAna(self.__path)
+        reference_probs = reference.__predict_probs(sentences, max_tokens=max_tokens)
+
+        report = {}
+        for backend in backends:
+            if missing_runtime(backend) is not None:
+                report[backend] = {'skipped': 'the %s package is not installed' % missing_runtime(backend)}
+                continue
+            other = self if backend == self.__backend else AraAna(self.__path, backend=backend)
+            pred_probs = other.__predict_probs(sentences, max_tokens=max_tokens)
+            diff = np.abs(pred_probs - reference_probs)
+            report[backend] = {
+                'label_agreement': float(np.mean(pred_probs.argmax(axis=1) == reference_probs.argmax(axis=1))),
+                'max_abs_diff': float(diff.max()) if diff.size else 0.0,
+                'mean_abs_diff': float(diff.mean()) if diff.size else 0.0,
+            }
+        return report
+
+    def autotune(self, sentences, max_tokens_grid=(1000, 2500, 5000, 10000, 20000), threads_grid=None, save=True,
+                 tuning_path=None):
+        '''
+            Measures the throughput on a representative sample of sentences for every batch
+            token budget of max_tokens_grid and every torch thread count of threads_grid
+            (powers of two up to the number of cores by default), then uses the best
+            configuration. Note that torch.set_num_threads applies to the whole process.
+
+            With save=True the configuration is stored in tuning_path (by default the
+            tuning path of the model, autotune.json in the model path), keyed by host and
+            backend. The next time the model is loaded on this host its batch token budget
+            is applied automatically, and its thread count only with tuned_threads=True.
+
+            Returns the best configuration with its throughput in sentences per second.
+        '''
+        if not len(sentences):
+            raise Exception('No sentences to autotune on')
+        tuning_path = tuning_path or self.__tuning_path
+        # fail before the measurements rather than after them
+        if save and not _is_writable(tuning_path):
+            raise Exception("Can't write the autotune results to %s" % tuning_path)
+        if threads_grid is None:
+            threads_grid = [2 ** i for i in range(int(np.log2(os.cpu_count() or 1)) + 1)]
+
+        sentences = _normalizer.normalize_many(sentences)
+        # a first pass outside the measurements warms up the kernels
+        self.__compute_probs(sentences[:10], max_tokens=max(max_tokens_grid))
+
+        best = None
+        for threads in threads_grid:
+            torch.set_num_threads(threads)
+            for max_tokens in max_tokens_grid:
+                start = time.perf_counter()
+                self.__compute_probs(sentences, max_tokens=max_tokens)
+                throughput = len(sentences) / (time.perf_counter() - start)
+                if best is None or throughput > best['sentences_per_second']:
+                    best = {'max_tokens': max_tokens, 'threads': threads, 'sentences_per_second': throughput}
+
+        self.__max_tokens = best['max_tokens']
+        torch.set_num_threads(best['threads'])
+        if save:
+            tuning = _load_tuning(tuning_path)
+            tuning.setdefault(_host_key(), {})[self.__backend] = best
+            with open(tuning_path, 'w') as json_file:
+                json.dump(tuning, json_file, indent=2)
+        return best
+
+    def __predict_probs(self, sentences, max_tokens=None, window=None):
+        if window is not None:
+            _check_window(*window)
 
-    def predict(self, text=None, path=None, with_dist=False):
         # init normalizer
-        language_normalizer = _araNorm()
+        sentences = _normalizer.normalize_many(sentences)
+
+        # every distinct normalized text is looked up and computed only once
+        unique_sentences = list(dict.fromkeys(sentences))
+        unique_probs = np.empty((len(unique_sentences), len(self.__ind2lab)), dtype=np.float32)
+        missing = []
+        for i, sentence in enumerate(unique_sentences):
+            probs = self.__cache.get((self.__model_id, window, sentence)) if self.__cache is not None else None
+            if probs is None:
+                missing.append(i)
+            else:
+                unique_probs[i] = probs
+
+        if missing:
+            unique_probs[missing] = self.__compute_probs([unique_sentences[i] for i in missing], max_tokens, window)
+            if self.__cache is not None:
+                for i in missing:
+                    self.__cache.put((self.__model_id, window, unique_sentences[i]), unique_probs[i].copy())
 
-        if text is not None:
-            sentences = [text]
-        elif path is not None:
-            if not os.path.exists(path):
-                raise Exception("File not found %s" % path)
+        positions = {sentence: i for i, sentence in enumerate(unique_sentences)}
+        return unique_probs[[positions[sentence] for sentence in sentences]]
 
-            # read the batch file in tsv format
-            df = pd.read_csv(path, delimiter='\t', header=None, names=['sentence'])
+    def __compute_probs(self, sentences, max_tokens=None, window=None):
+        if max_tokens is None:
+            max_tokens = self.__max_tokens
 
-            # Create sentence lists
-            sentences = df.sentence.values
+        # load test data, [CLS] is added at the beginning of each sentence for BERT to work properly
+        if window is None:
+            input_ids = _data_prepare(self.__tokenizer, sentences=sentences)
         else:
-            raise Exception('No text/path specified')
+            input_ids, owners, lengths = _data_prepare_windows(self.__tokenizer, sentences=sentences, stride=window[0])
 
-        # adding special tokens at the beginning and end of each sentence for BERT to work properly
-        sentences = ["[CLS] " + language_normalizer.run(sentence) for sentence in sentences]
+        pred_probs = np.empty((len(input_ids), len(self.__ind2lab)), dtype=np.float32)
+        for indices, b_input_ids, b_input_mask in _bucketed_batches(input_ids, max_tokens):
+            b_input_ids = b_input_ids.to(self.__device)
+            b_input_mask = b_input_mask.to(self.__device)
 
-        # load test data
-        test_inputs, test_masks = self.__data_prepare(sentences=sentences)
-        test_data = TensorDataset(test_inputs, test_masks)
-        test_dataloader = DataLoader(test_data, batch_size=100)
+            # Telling the model not to compute or store gradients, saving memory and speeding up validation
+            with torch.no_grad():
+                # Forward pass, calculate logit predictions on the CPU
+                logits = self.__forward(b_input_ids, b_input_mask)
 
-        # set model to evaluation mode
-        self.__model.eval()
+            # store the probabilities back at the original positions of the sentences
+            pred_probs[indices] = nn.functional.softmax(logits, dim=1).numpy()
 
-        results = []
-        for batch in test_dataloader:
-            batch = tuple(t.to(self.__device) for t in batch)
+        if window is not None:
+            pred_probs = _aggregate_windows(pred_probs, owners, lengths, len(sentences), aggregate=window[1])
+        return pred_probs
 
-            # Unpack the inputs from dataloader
-            b_input_ids, b_input_mask = batch
-            del batch
 
-            # Telling the model not to compute or store gradients, saving memory and speeding up validation
+class Predictions():
+    '''
+        Columnar predictions, one NumPy array per field instead of one tuple per sentence.
+
+        - labels: the label vocabulary, labels[i] is the label of column i of probs
+        - probs: the (sentences x labels) probability matrix
+        - label_ids: index in labels of the top label of every sentence
+        - top_probs: probability of the top label of every sentence
+        - positions: position of every sentence in the input, kept when rows are selected
+    '''
+
+    def __init__(self, probs, labels, positions=None):
+        self.probs = probs
+        self.labels = np.asarray(labels, dtype=object)
+        self.positions = np.arange(len(probs)) if positions is None else positions
+        self.label_ids = probs.argmax(axis=1)
+        self.top_probs = probs[np.arange(len(probs)), self.label_ids]
+
+    def __len__(self):
+        return len(self.probs)
+
+    def __getitem__(self, rows):
+        '''
+            Selects rows with a boolean mask, an index array or a slice.
+        '''
+        return Predictions(self.probs[rows], self.labels, self.positions[rows])
+
+    def top_labels(self):
+        return self.labels[self.label_ids]
+
+    def above(self, threshold):
+        '''
+            Returns the rows whose top probability is at least threshold.
+        '''
+        return self[self.top_probs >= threshold]
+
+    def top_k(self, k, threshold=None):
+        '''
+            Returns (label_ids, probs) arrays of shape (sentences, k), best label first. With a
+            threshold, the labels whose probability is below it get the id -1.
+        '''
+        k = min(k, self.probs.shape[1])
+        label_ids = np.argpartition(-self.probs, k - 1, axis=1)[:, :k]
+        probs = np.take_along_axis(self.probs, label_ids, axis=1)
+        order = np.argsort(-probs, axis=1, kind='stable')
+        label_ids = np.take_along_axis(label_ids, order, axis=1)
+        probs = np.take_along_axis(probs, order, axis=1)
+        if threshold is not None:
+            label_ids = np.where(probs >= threshold, label_ids, -1)
+        return label_ids, probs
+
+    def to_arrow(self, with_dist=True):
+        '''
+            Returns a pyarrow Table with the position, label and prob columns, and with
+            with_dist=True a prob_<label> column per label.
+        '''
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise Exception('Arrow and Parquet output needs the pyarrow package')
+
+        columns = {
+            'position': pa.array(self.positions),
+            'label': pa.DictionaryArray.from_arrays(pa.array(self.label_ids, type=pa.int32()),
+                                                    pa.array(self.labels.tolist(), type=pa.string())),
+            'prob': pa.array(self.top_probs),
+        }
+        if with_dist:
+            for i, label in enumerate(self.labels):
+                columns['prob_%s' % label] = pa.array(self.probs[:, i])
+        return pa.table(columns)
+
+    def to_parquet(self, path, with_dist=True):
+        table = self.to_arrow(with_dist=with_dist)
+        import pyarrow.parquet as pq
+        pq.write_table(table, path)
+
+
+class _PredictionCache():
+    '''
+        Bounded LRU cache of predicted probabilities with hit and miss counters.
+    '''
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, key):
+        with self.__lock:
+            probs = self.__entries.get(key)
+            if probs is None:
+                self.misses += 1
+                return None
+            self.__entries.move_to_end(key)
+            self.hits += 1
+            return probs
+
+    def put(self, key, probs):
+        with self.__lock:
+            self.__entries[key] = probs
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.maxsize:
+                self.__entries.popitem(last=False)
+
+    def info(self):
+        with self.__lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self.__entries), 'maxsize': self.maxsize}
+
+
+class AraAnaMultiTask():
+    '''
+        Runs several AraAna classifiers on top of one shared BERT encoder.
+
+        Every task directory has the same layout as for AraAna (a `model` directory and
+        a `labels-dict.json` file). The encoder is loaded once, from `encoder_path` or
+        from the first task, and only the `classifier` layer of every other task is kept.
+        A sentence is normalized, tokenized and encoded once per call and the pooled
+        output is sent to every task head. A head only reproduces its standalone model
+        on the encoder it was fine-tuned with, so a task whose encoder weights differ
+        from the shared ones is run on its own encoder, which is then shared with the
+        later tasks that have the same weights.
+    '''
+
+    def __init__(self, paths, encoder_path=None):
+        # check if gpu is available
+        self.__device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+        if not paths:
+            raise Exception('Undefined paths to models')
+        for task, path in paths.items():
+            if path is None:
+                raise Exception('Undefined path to model %s' % task)
+            if not os.path.exists(os.path.join(path, 'model')):
+                raise Exception("Couldn't find the path %s" % os.path.join(path, 'model'))
+        self.__paths = dict(paths)
+
+        if encoder_path is None:
+            encoder_path = os.path.join(next(iter(self.__paths.values())), 'model')
+        if not os.path.exists(encoder_path):
+            raise Exception("Couldn't find the path %s" % encoder_path)
+
+        # load the shared tokenizer and encoder
+        try:
+            self.__tokenizer = BertTokenizerFast.from_pretrained(encoder_path, do_lower_case=True)
+        except Exception as e:
+            raise Exception("Couldn't load the model", e)
+        # every encoder with the tasks whose heads run on its pooled output
+        self.__encoders = [(self.__load_encoder(encoder_path), [])]
+
+        # load the classification head and the labels dictionary of every task
+        self.__heads = {}
+        self.__ind2lab = {}
+        for task, path in self.__paths.items():
+            model_path = os.path.join(path, 'model')
+            if _read_vocab(model_path) != _read_vocab(encoder_path):
+                raise Exception("The vocabulary of %s doesn't match the shared encoder" % model_path)
+
+            try:
+                state_dict = _load_state_dict(model_path)
+                weight, bias = state_dict['classifier.weight'], state_dict['classifier.bias']
+            except Exception as e:
+                raise Exception("Couldn't load the model", e)
+
+            # the encoder weights of this task are only needed to pick the encoder it runs on
+            for encoder, tasks in self.__encoders:
+                if _same_encoder(state_dict, encoder.state_dict()):
+                    tasks.append(task)
+                    break
+            else:
+                self.__encoders.append((self.__load_encoder(model_path), [task]))
+            del state_dict
+
+            head = nn.Linear(weight.shape[1], weight.shape[0])
+            head.load_state_dict({'weight': weight, 'bias': bias})
+            self.__heads[task] = head.to(self.__device).eval()
+            _, self.__ind2lab[task] = _load_labels(path)
+
+        # the default encoder is dropped when no task runs on it
+        self.__encoders = [(encoder, tasks) for encoder, tasks in self.__encoders if tasks]
+
+    def __load_encoder(self, model_path):
+        try:
+            encoder = BertModel.from_pretrained(pretrained_model_name_or_path=model_path)
+        except Exception as e:
+            raise Exception("Couldn't load the model", e)
+        return encoder.to(self.__device).eval()
+
+    def predict(self, text=None, path=None, with_dist=False, max_tokens=5000, long_document=False, stride=25,
+                aggregate='mean'):
+        '''
+            Returns a dictionary mapping every task to the same results list AraAna.predict returns.
+        '''
+        if long_document:
+            _check_window(stride, aggregate)
+
+        sentences = _read_sentences(text=text, path=path)
+        sentences = _normalizer.normalize_many(sentences)
+
+        if long_document:
+            input_ids, owners, lengths = _data_prepare_windows(self.__tokenizer, sentences=sentences, stride=stride)
+        else:
+            input_ids = _data_prepare(self.__tokenizer, sentences=sentences)
+
+        pred_probs = {task: np.empty((len(input_ids), len(self.__ind2lab[task])), dtype=np.float32)
+                      for task in self.__heads}
+        for indices, b_input_ids, b_input_mask in _bucketed_batches(input_ids, max_tokens):
+            b_input_ids = b_input_ids.to(self.__device)
+            b_input_mask = b_input_mask.to(self.__device)
+
             with torch.no_grad():
-                # Forward pass, calculate logit predictions
-                logits = self.__model(input_ids=b_input_ids, attention_mask=b_input_mask)
+                # one pass per distinct encoder, then every task head on its pooled output
+                for encoder, tasks in self.__encoders:
+                    pooled_output = encoder(input_ids=b_input_ids, attention_mask=b_input_mask)[1]
+                    for task in tasks:
+                        logits = self.__heads[task](pooled_output).cpu()
+                        pred_probs[task][indices] = nn.functional.softmax(logits, dim=1).numpy()
+
+        if long_document:
+            pred_probs = {task: _aggregate_windows(probs, owners, lengths, len(sentences), aggregate=aggregate)
+                          for task, probs in pred_probs.items()}
+
+        return {task: _format_results(probs, self.__ind2lab[task], with_dist) for task, probs in pred_probs.items()}
+
+
+def _read_sentences(text=None, path=None):
+    if text is not None:
+        return [text]
+    elif path is not None:
+        if not os.path.exists(path):
+            raise Exception("File not found %s" % path)
+
+        # read the batch file in tsv format
+        df = pd.read_csv(path, delimiter='\t', header=None, names=['sentence'])
+
+        # Create sentence lists
+        return df.sentence.values
+    else:
+        raise Exception('No text/path specified')
+
+
+def _load_labels(path):
+    # load the labels dictionary
+    dict_path = os.path.join(path, 'labels-dict.json')
+    if not os.path.exists(dict_path):
+        raise Exception("Couldn't find the path %s" % dict_path)
+    with open(dict_path) as json_file:
+        lab2ind = json.load(json_file)
+    ind2lab = {}
+    for label in lab2ind.keys():
+        ind2lab[lab2ind[label]] = label
+    return lab2ind, ind2lab
+
+
+def _read_vocab(model_path):
+    with open(os.path.join(model_path, 'vocab.txt'), encoding='utf-8') as vocab_file:
+        return vocab_file.read()
+
+
+def _load_state_dict(model_path):
+    safetensors_path = os.path.join(model_path, 'model.safetensors')
+    if os.path.exists(safetensors_path):
+        from safetensors.torch import load_file
+        return load_file(safetensors_path)
+    return torch.load(os.path.join(model_path, 'pytorch_model.bin'), map_location='cpu')
 
-            # Move logits and labels to CPU
-            logits = logits[0].cpu()
 
-            pred_probs = nn.functional.softmax(logits, dim=1)
-            max_values, max_indices = torch.max(pred_probs, 1)
-            max_values = max_values.numpy()
-            max_indices = max_indices.numpy()
-            pred_probs = pred_probs.numpy()
+def _same_encoder(state_dict, encoder_state):
+    # the bert.* weights of a fine-tuned checkpoint against the weights of a loaded BertModel
+    for key, value in state_dict.items():
+        if key.startswith('bert.') and key[5:] in encoder_state:
+            if not torch.equal(value, encoder_state[key[5:]].cpu()):
+                return False
+    return True
 
-            for i in range(len(max_indices)):
-                if with_dist:
-                    results.extend([(self.__ind2lab[max_indices[i]], max_values[i],
-                                     tuple(zip(self.__ind2lab.values(), pred_probs[i])))])
-                else:
-                    results.extend([(self.__ind2lab[max_indices[i]], max_values[i])])
 
-        return results
+def _host_key():
+    return '%s-%dcpu' % (platform.node(), os.cpu_count() or 1)
 
-    def __data_prepare(self, sentences, MAX_LEN=50):
-        # Import the BERT tokenizer, used to convert the text into tokens that correspond to BERT's vocabulary.
-        tokenized_texts = [self.__tokenizer.tokenize(sent) for sent in sentences]
-        # Use the BERT tokenizer to convert the tokens to their index numbers in the BERT vocabulary
-        input_ids = [self.__tokenizer.convert_tokens_to_ids(x) for x in tokenized_texts]
 
-        # Pad the input tokens
-        input_ids = pad_sequences(input_ids, maxlen=MAX_LEN, dtype=np.int_, truncating="post", padding="post")
+def _load_tuning(tuning_path):
+    if not os.path.exists(tuning_path):
+        return {}
+    with open(tuning_path) as json_file:
+        return json.load(json_file)
 
-        # Create attention masks
-        attention_masks = []
 
-        # Create a mask of 1s for each token followed by 0s for padding
-        for seq in input_ids:
-            seq_mask = [float(i > 0) for i in seq]
-            attention_masks.append(seq_mask)
+def _is_writable(path):
+    if os.path.exists(path):
+        return os.access(path, os.W_OK)
+    return os.access(os.path.dirname(os.path.abspath(path)), os.W_OK)
+
+
+def _format_results(pred_probs, ind2lab, with_dist=False):
+    max_indices = np.argmax(pred_probs, axis=1)
+    max_values = pred_probs[np.arange(len(max_indices)), max_indices]
+
+    results = []
+    for i in range(len(max_indices)):
+        if with_dist:
+            results.extend([(ind2lab[max_indices[i]], max_values[i],
+                             tuple(zip(ind2lab.values(), pred_probs[i])))])
+        else:
+            results.extend([(ind2lab[max_indices[i]], max_values[i])])
+    return results
+
+
+def _format_line(result):
+    fields = [result[0], '%.6f' % result[1]]
+    if len(result) > 2:
+        fields.extend('%.6f' % prob for _, prob in result[2])
+    return '\t'.join(fields) + '\n'
+
+
+def _data_prepare(tokenizer, sentences, MAX_LEN=50):
+    # Tokenize the whole list at once with the fast tokenizer, leaving room for [CLS] within MAX_LEN tokens;
+    # padding is done per batch by _pad_batch
+    input_ids = tokenizer(list(sentences), add_special_tokens=False, truncation=True, max_length=MAX_LEN - 1,
+                          return_attention_mask=False, return_token_type_ids=False)['input_ids']
+    return [[tokenizer.cls_token_id] + ids for ids in input_ids]
+
+
+def _data_prepare_windows(tokenizer, sentences, MAX_LEN=50, stride=25):
+    '''
+        Splits every sentence into windows of MAX_LEN - 1 tokens overlapping by stride tokens,
+        each one starting with [CLS]. Returns the windows, the index of the sentence of every
+        window and the number of sentence tokens in every window.
+    '''
+    size = MAX_LEN - 1
+    step = size - stride
+    token_ids = tokenizer(list(sentences), add_special_tokens=False, return_attention_mask=False,
+                          return_token_type_ids=False)['input_ids']
+
+    windows, owners, lengths = [], [], []
+    for owner, ids in enumerate(token_ids):
+        # a new window is only started while the previous one doesn't reach the end of the sentence
+        for start in range(0, max(len(ids) - stride, 1), step):
+            window = ids[start:start + size]
+            windows.append([tokenizer.cls_token_id] + window)
+            owners.append(owner)
+            lengths.append(len(window))
+    return windows, owners, lengths
+
+
+def _check_window(stride, aggregate, MAX_LEN=50):
+    if not 0 <= stride < MAX_LEN - 1:
+        raise Exception('The stride must be between 0 and %d' % (MAX_LEN - 2))
+    if aggregate not in AGGREGATES:
+        raise Exception('Unknown aggregate %s, expected one of %s' % (aggregate, ', '.join(AGGREGATES)))
+
+
+def _aggregate_windows(window_probs, owners, lengths, n_sentences, aggregate='mean'):
+    owners = np.asarray(owners)
+    if aggregate == 'max':
+        pred_probs = np.zeros((n_sentences, window_probs.shape[1]), dtype=np.float32)
+        np.maximum.at(pred_probs, owners, window_probs)
+        return pred_probs / pred_probs.sum(axis=1, keepdims=True)
+
+    if aggregate == 'weighted':
+        weights = np.maximum(np.asarray(lengths, dtype=np.float32), 1)
+    else:
+        weights = np.ones(len(owners), dtype=np.float32)
+    pred_probs = np.zeros((n_sentences, window_probs.shape[1]), dtype=np.float32)
+    np.add.at(pred_probs, owners, window_probs * weights[:, None])
+    totals = np.zeros(n_sentences, dtype=np.float32)
+    np.add.at(totals, owners, weights)
+    return pred_probs / totals[:, None]
+
+
+def _length_batches(lengths, max_tokens=5000):
+    '''
+        Groups sentence indices into batches of similar length.
+
+        The indices are sorted by length and a batch is closed as soon as padding it to its
+        longest sentence would exceed max_tokens, so short sentences end up in large batches
+        and long sentences in small ones. A sentence longer than max_tokens gets its own batch.
+    '''
+    batch = []
+    for index in np.argsort(lengths, kind='stable'):
+        # the lengths are ascending, so the current sentence is the longest of the batch
+        if batch and (len(batch) + 1) * lengths[index] > max_tokens:
+            yield batch
+            batch = []
+        batch.append(index)
+    if batch:
+        yield batch
+
 
-        # Convert all of the data into torch tensors, the required datatype for the model
-        inputs = torch.LongTensor(input_ids)
-        masks = torch.tensor(attention_masks)
+def _pad_batch(input_ids):
+    lengths = np.fromiter(map(len, input_ids), dtype=np.int64, count=len(input_ids))
 
-        return inputs, masks
+    # Create a mask of 1s for each token followed by 0s for padding
+    attention_masks = np.arange(lengths.max()) < lengths[:, None]
+
+    # Pad the input tokens to the longest sentence of the batch
+    padded_ids = np.zeros(attention_masks.shape, dtype=np.int64)
+    padded_ids[attention_masks] = np.concatenate(input_ids)
+
+    # Convert all of the data into torch tensors, the required datatype for the model
+    return torch.from_numpy(padded_ids), torch.from_numpy(attention_masks.astype(np.float32))
+
+
+def _bucketed_batches(input_ids, max_tokens=5000):
+    for indices in _length_batches([len(ids) for ids in input_ids], max_tokens):
+        inputs, masks = _pad_batch([input_ids[i] for i in indices])
+        yield indices, inputs, masks
 
 
 '''--------------------------------------------------------------------------------
@@ -153,51 +710,53 @@ Normalization functions:
 - replace number with NUM
 - Remove non letters or digits characters such as emoticons
 ------------------------------------------------------------------------------------'''
+import multiprocessing
 import re
 
 
 class _araNorm():
     '''
         araNorm is a normalizer class for n Arabic Text
-    '''
 
-    def __init__(self):
-        '''
-        List of normalized characters
-        '''
-        self.normalize_chars = {u"\u0622": u"\u0627", u"\u0623": u"\u0627", u"\u0625": u"\u0627",
-                                # All Araf forms to Alaf without hamza
-                                u"\u0649": u"\u064A",  # ALEF MAKSURA to YAH
-                                u"\u0629": u"\u0647"  # TEH MARBUTA to  HAH
-                                }
-        '''
-        list of diac unicode and underscore
-        '''
-        self.Tashkeel_underscore_chars = {u"\u0640": "_", u"\u064E": 'a', u"\u064F": 'u', u"\u0650": 'i',
-                                          u"\u0651": '~', u"\u0652": 'o', u"\u064B": 'F', u"\u064C": 'N',
-                                          u"\u064D": 'K'}
+        The translation table and the regular expressions are built once for the class,
+        so one instance can be shared and reused for any number of texts.
+    '''
 
-    def __normalizeChar(self, inputText):
+    '''
+    List of normalized characters
+    '''
+    normalize_chars = {u"\u0622": u"\u0627", u"\u0623": u"\u0627", u"\u0625": u"\u0627",
+                       # All Araf forms to Alaf without hamza
+                       u"\u0649": u"\u064A",  # ALEF MAKSURA to YAH
+                       u"\u0629": u"\u0647"  # TEH MARBUTA to  HAH
+                       }
+    '''
+    list of diac unicode and underscore
+    '''
+    Tashkeel_underscore_chars = {u"\u0640": "_", u"\u064E": 'a', u"\u064F": 'u', u"\u0650": 'i',
+                                 u"\u0651": '~', u"\u0652": 'o', u"\u064B": 'F', u"\u064C": 'N',
+                                 u"\u064D": 'K'}
+
+    # steps #2 and #3 in one table, none of the normalized characters is a diac
+    __translation = str.maketrans({**normalize_chars, **dict.fromkeys(Tashkeel_underscore_chars)})
+
+    __repetition = re.compile(r"(.)\1{2,}", re.DOTALL)
+    __link = re.compile(r'(\w+:\/\/[ ]*\S+)')
+    __plus = re.compile(r'\++')
+    __link_run = re.compile(r'(URL\s*)+')
+    __username = re.compile(r'(@[a-zA-Z0-9_]+)')
+    __username_run = re.compile(r'(USER\s*)+')
+    __number = re.compile(r'[\d\.]+')
+    __number_run = re.compile(r'(NUM\s*)+')
+    __non_letter = re.compile(r'[\W_\d\s]', re.IGNORECASE | re.UNICODE)  # re.compile('\p{Arabic}')
+    __space = re.compile(r'\s+')
+
+    def __normalizeChar_remover_tashkeel(self, inputText):
         '''
         step #2: Normalize Alef and Yeh forms
-        '''
-        norm = ""
-        for char in inputText:
-            if char in self.normalize_chars:
-                norm = norm + self.normalize_chars[char]
-            else:
-                norm = norm + char
-        return norm
-
-    def __remover_tashkeel(self, inputText):
-        '''
         step #3: Remove Tashkeeel (diac) from Atabic text
         '''
-        text_without_Tashkeel = ""
-        for char in inputText:
-            if char not in self.Tashkeel_underscore_chars:
-                text_without_Tashkeel += char
-        return text_without_Tashkeel
+        return inputText.translate(self.__translation)
 
     def __reduce_characters(self, inputText):
         '''
@@ -206,34 +765,32 @@ class _araNorm():
         '''
         # pattern to look for three or more repetitions of any character, including
         # newlines.
-        pattern = re.compile(r"(.)\1{2,}", re.DOTALL)
-        reduced_text = pattern.sub(r"\1\1", inputText)
-        return reduced_text
+        return self.__repetition.sub(r"\1\1", inputText)
 
     def __replace_links(self, inputText):
         '''
         step #5: repalce links to LINK
                  For example: http://too.gl/sadsad322 will replaced to LINK
         '''
-        text = re.sub('(\w+:\/\/[ ]*\S+)', '+++++++++', inputText)  # LINK
-        text = re.sub('\++', 'URL', text)
-        return re.sub('(URL\s*)+', ' URL ', text)
+        text = self.__link.sub('+++++++++', inputText)  # LINK
+        text = self.__plus.sub('URL', text)
+        return self.__link_run.sub(' URL ', text)
 
     def __replace_username(self, inputText):
         '''
         step #5: Remove twitter username with the word USER
                  For example: @elmadany will replaced by space
         '''
-        text = re.sub('(@[a-zA-Z0-9_]+)', 'USER', inputText)
-        return re.sub('(USER\s*)+', ' USER ', text)
+        text = self.__username.sub('USER', inputText)
+        return self.__username_run.sub(' USER ', text)
 
     def __replace_Number(self, inputText):
         '''
         step #7: replace number with NUM
                  For example: \d+ will replaced with NUM
         '''
-        text = re.sub('[\d\.]+', 'NUM', inputText)
-        return re.sub('(NUM\s*)+', ' NUM ', text)
+        text = self.__number.sub('NUM', inputText)
+        return self.__number_run.sub(' NUM ', text)
 
     def __remove_nonLetters_Digits(self, inputText):
         '''
@@ -241,54 +798,146 @@ class _araNorm():
                  For example: emoticons...etc
                  this step is very important for w2v  and similar models; and dictionary
         '''
-        p1 = re.compile('[\W_\d\s]', re.IGNORECASE | re.UNICODE)  # re.compile('\p{Arabic}')
-        sent = re.sub(p1, ' ', inputText)
-        p1 = re.compile('\s+')
-        sent = re.sub(p1, ' ', sent)
-        return sent
+        sent = self.__non_letter.sub(' ', inputText)
+        return self.__space.sub(' ', sent)
 
     def run(self, text):
-        normtext = ""
-        text = self.__normalizeChar(text)
-        text = self.__remover_tashkeel(text)
+        text = self.__normalizeChar_remover_tashkeel(text)
         text = self.__reduce_characters(text)
         text = self.__replace_links(text)
         text = self.__replace_username(text)
         text = self.__replace_Number(text)
         text = self.__remove_nonLetters_Digits(text)
-        text = re.sub('\s+', ' ', text.strip())
-        text = re.sub('\s+$', '', text.strip())
-        normtext = re.sub('^\s+', '', text.strip())
-        return normtext
+        # only single spaces are left, so stripping the ends is all that remains to do
+        return text.strip()
+
+    def normalize_many(self, texts, n_jobs=None, chunksize=1000):
+        '''
+        Normalizes an iterable of texts and returns a list, using a pool of n_jobs
+        processes when n_jobs > 1.
+        '''
+        if n_jobs is None or n_jobs <= 1:
+            return [self.run(text) for text in texts]
+        with multiprocessing.Pool(n_jobs) as pool:
+            return pool.map(self.run, texts, chunksize=chunksize)
+
+
+# the normalizer has no per-text state, one instance is shared by all the models
+_normalizer = _araNorm()
+
+
+# model loaded once by every worker process of the command-line batch mode
+_worker_identifier = None
+
+
+def _init_worker(model_path, backend, threads):
+    global _worker_identifier
+    _worker_identifier = AraAna(model_path, backend=backend)
+    # every worker gets its share of the cores instead of all of them
+    torch.set_num_threads(threads)
+
+
+def _predict_chunk(args):
+    sentences, with_dist = args
+    return _worker_identifier.predict_sentences(sentences, with_dist=with_dist)
+
+
+def _line_chunks(lines, chunk_size):
+    chunk = []
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if line.strip():
+            chunk.append(line)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _predict_lines(lines, output, options):
+    '''
+        Predicts the lines in chunks and writes the results in input order, spreading the
+        chunks over options.workers processes. Returns the number of sentences.
+    '''
+    threads = options.threads or max(1, multiprocessing.cpu_count() // options.workers)
+    chunks = ((chunk, options.dist) for chunk in _line_chunks(lines, options.chunk_size))
+    count = 0
+    if options.workers <= 1:
+        _init_worker(options.model, options.backend, threads)
+        for results in map(_predict_chunk, chunks):
+            output.write(''.join(_format_line(result) for result in results))
+            count += len(results)
+        return count
+
+    with multiprocessing.Pool(options.workers, initializer=_init_worker,
+                              initargs=(options.model, options.backend, threads)) as pool:
+        # feed a bounded window of chunks at a time so the input is never read ahead entirely
+        window = []
+        for chunk in itertools.chain(chunks, [None]):
+            if chunk is not None:
+                window.append(chunk)
+            if window and (chunk is None or len(window) == options.workers * 4):
+                # imap keeps the input order while the workers run in parallel
+                for results in pool.imap(_predict_chunk, window):
+                    output.write(''.join(_format_line(result) for result in results))
+                    count += len(results)
+                window = []
+    return count
 
 
 def main():
-    path = "araana/models"
-    identifier = AraAna(path)
-    if path is not None:
-        # "==== Batch Mode ===="
-        predictions = identifier.predict(text=None, path=path)
-        print(predictions)
-    else:
-        import sys
-        if sys.stdin.isatty():
-            # "==== Interactive Mode ===="
-            while True:
-                try:
-                    print(">>>", end=' ')
-                    text = input()
-                except Exception as e:
-                    print(e)
-                    break
-                predictions = identifier.predict(text=text, path=None)
-                print(predictions)
-        else:
-            # "==== Redirected Mode ===="
-            lines = sys.stdin.read()
-            predictions = []
-            for text in lines:
-                predictions.extend(identifier.predict(text=text, path=None))
+    parser = optparse.OptionParser(usage='python -m araana.aranet -m MODEL_DIR [-i INPUT] [-o OUTPUT] [-w WORKERS]')
+    parser.add_option('-m', '--model', dest='model', help='model directory with model/ and labels-dict.json')
+    parser.add_option('-i', '--input', dest='input', help='input file with one sentence per line')
+    parser.add_option('-o', '--output', dest='output', help='output file, stdout by default')
+    parser.add_option('-w', '--workers', dest='workers', type='int', default=1, help='number of worker processes')
+    parser.add_option('-t', '--threads', dest='threads', type='int', default=0,
+                      help='torch threads per worker, cores / workers by default')
+    parser.add_option('-b', '--backend', dest='backend', default='eager', help=', '.join(backends.BACKENDS))
+    parser.add_option('-c', '--chunk-size', dest='chunk_size', type='int', default=1000,
+                      help='sentences sent to a worker at a time')
+    parser.add_option('-d', '--dist', dest='dist', action='store_true', default=False,
+                      help='also write the probability of every label')
+    options, _ = parser.parse_args()
+    if options.model is None:
+        parser.error('the model directory is required')
+    if options.workers < 1:
+        parser.error('the number of workers must be at least 1')
+    if options.threads < 0:
+        parser.error('the number of threads must not be negative')
+    if options.chunk_size < 1:
+        parser.error('the chunk size must be at least 1')
+
+    import sys
+    if options.input is None and sys.stdin.isatty():
+        # "==== Interactive Mode ===="
+        identifier = AraAna(options.model, backend=options.backend)
+        while True:
+            try:
+                print(">>>", end=' ')
+                text = input()
+            except Exception as e:
+                print(e)
+                break
+            predictions = identifier.predict(text=text, path=None, with_dist=options.dist)
             print(predictions)
+        return
+
+    # "==== Batch Mode ====" on the input file, or on the redirected stdin lines
+    start = time.perf_counter()
+    input_file = open(options.input, encoding='utf-8') if options.input is not None else sys.stdin
+    output = open(options.output, 'w', encoding='utf-8') if options.output is not None else sys.stdout
+    try:
+        count = _predict_lines(input_file, output, options)
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output is not sys.stdout:
+            output.close()
+    elapsed = time.perf_counter() - start
+    print('%d sentences in %.2fs (%.1f sentences/s)' % (count, elapsed, count / elapsed if elapsed else 0.0),
+          file=sys.stderr)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,138 @@
+# encoding: utf-8
+'''
+    CPU inference backends for AraAna.
+
+    - eager: the BertForSequenceClassification model as loaded by transformers
+    - torchscript: the model traced with torch.jit
+    - onnx: the model exported to ONNX and served by ONNX Runtime
+    - int8: the model with its Linear layers dynamically quantized to int8, then traced
+
+    Every non eager backend is exported once and cached in the given cache directory,
+    later loads read the cached file and don't need to load the transformers model. The
+    name of the cached file carries the size and modification time of the checkpoint
+    files, so replacing the checkpoint triggers a new export.
+    Every backend returns a `forward(input_ids, attention_mask)` callable that gives the
+    logits as a CPU tensor.
+'''
+import hashlib
+import importlib.util
+import os
+import numpy as np
+import torch
+from torch import nn
+from transformers import BertForSequenceClassification
+
+BACKENDS = ('eager', 'torchscript', 'onnx', 'int8')
+
+_CACHE_FILES = {'torchscript': 'model-torchscript-%s.pt', 'onnx': 'model-%s.onnx', 'int8': 'model-int8-%s.pt'}
+# files of a checkpoint that change the exported model
+_CHECKPOINT_FILES = ('config.json', 'model.safetensors', 'pytorch_model.bin')
+# python package that every backend needs on top of torch and transformers
+_RUNTIMES = {'onnx': 'onnxruntime'}
+
+
+class _LogitsModule(nn.Module):
+    '''
+        Wraps the model so that tracing and exporting see plain tensors in and out.
+    '''
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask, return_dict=False)[0]
+
+
+def missing_runtime(backend):
+    '''
+        Returns the name of the package the backend needs and that isn't installed, or None.
+    '''
+    runtime = _RUNTIMES.get(backend)
+    if runtime is not None and importlib.util.find_spec(runtime) is None:
+        return runtime
+    return None
+
+
+def load_backend(model_path, backend, cache_dir, device):
+    if backend not in BACKENDS:
+        raise Exception('Unknown backend %s, expected one of %s' % (backend, ', '.join(BACKENDS)))
+    if missing_runtime(backend) is not None:
+        raise Exception('The %s backend needs the %s package' % (backend, missing_runtime(backend)))
+
+    if backend == 'eager':
+        model = _load_model(model_path).to(device)
+        return lambda input_ids, attention_mask: model(input_ids=input_ids, attention_mask=attention_mask)[0].cpu()
+
+    cache_path = os.path.join(cache_dir, _CACHE_FILES[backend] % _checkpoint_key(model_path))
+    if not os.path.exists(cache_path):
+        os.makedirs(cache_dir, exist_ok=True)
+        _export(_load_model(model_path), backend, cache_path)
+        _remove_stale_exports(cache_dir, backend, cache_path)
+
+    if backend == 'onnx':
+        return _load_onnx(cache_path)
+    model = torch.jit.load(cache_path, map_location='cpu')
+    return lambda input_ids, attention_mask: model(input_ids, attention_mask)
+
+
+def _checkpoint_key(model_path):
+    # size and modification time of the checkpoint files, hashing the weights would cost a full read per load
+    fingerprint = hashlib.sha1()
+    for name in _CHECKPOINT_FILES:
+        path = os.path.join(model_path, name)
+        if os.path.exists(path):
+            stat = os.stat(path)
+            fingerprint.update(('%s:%d:%d;' % (name, stat.st_size, stat.st_mtime_ns)).encode('utf-8'))
+    return fingerprint.hexdigest()[:16]
+
+
+def _remove_stale_exports(cache_dir, backend, cache_path):
+    prefix, suffix = _CACHE_FILES[backend].split('%s')
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if name.startswith(prefix) and name.endswith(suffix) and path != cache_path:
+            os.remove(path)
+
+
+def _load_model(model_path):
+    model = BertForSequenceClassification.from_pretrained(pretrained_model_name_or_path=model_path)
+    return model.eval()
+
+
+def _example_inputs():
+    return torch.ones((2, 8), dtype=torch.long), torch.ones((2, 8), dtype=torch.float)
+
+
+def _export(model, backend, cache_path):
+    # export to a temporary file first so an interrupted export is never picked up by the cache
+    tmp_path = cache_path + '.tmp'
+    module = _LogitsModule(model).eval()
+    if backend == 'int8':
+        module = torch.quantization.quantize_dynamic(module, {nn.Linear}, dtype=torch.qint8)
+
+    with torch.no_grad():
+        if backend == 'onnx':
+            torch.onnx.export(module, _example_inputs(), tmp_path,
+                              input_names=['input_ids', 'attention_mask'], output_names=['logits'],
+                              dynamic_axes={'input_ids': {0: 'batch', 1: 'sequence'},
+                                            'attention_mask': {0: 'batch', 1: 'sequence'},
+                                            'logits': {0: 'batch'}},
+                              opset_version=14)
+        else:
+            traced = torch.jit.trace(module, _example_inputs(), check_trace=False)
+            torch.jit.save(traced, tmp_path)
+    os.replace(tmp_path, cache_path)
+
+
+def _load_onnx(cache_path):
+    import onnxruntime
+
+    session = onnxruntime.InferenceSession(cache_path, providers=['CPUExecutionProvider'])
+
+    def forward(input_ids, attention_mask):
+        logits = session.run(['logits'], {'input_ids': input_ids.cpu().numpy(),
+                                          'attention_mask': attention_mask.cpu().numpy().astype(np.float32)})[0]
+        return torch.from_numpy(logits)
+
+    return forward
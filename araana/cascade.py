@@ -0,0 +1,148 @@
+# encoding: utf-8
+'''
+    Confidence cascade for AraAna: a cheap lexical classifier answers the texts it is
+    confident about and only the uncertain ones are sent to BERT.
+'''
+import os
+import pickle
+import re
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+
+from .aranet import _format_results, _normalizer, _read_sentences
+
+_ARABIC_LETTER = re.compile(u'[\u0621-\u064A]')
+
+
+class HashedNgramClassifier():
+    '''
+        Linear classifier (logistic regression trained with SGD) over hashed character n-grams
+        of the normalized text. The feature space has a fixed size, so the model is small and
+        its cost per text only depends on the text length.
+    '''
+
+    def __init__(self, n_labels, n_features=2 ** 18, ngram_range=(2, 4)):
+        self.n_labels = n_labels
+        self.vectorizer = HashingVectorizer(analyzer='char_wb', ngram_range=ngram_range, n_features=n_features,
+                                            alternate_sign=False)
+        self.model = SGDClassifier(loss='log_loss', alpha=1e-6)
+
+    def fit(self, sentences, label_ids, epochs=5):
+        features = self.vectorizer.transform(sentences)
+        classes = np.arange(self.n_labels)
+        for _ in range(epochs):
+            self.model.partial_fit(features, label_ids, classes=classes)
+        return self
+
+    def predict_proba(self, sentences):
+        return self.model.predict_proba(self.vectorizer.transform(sentences))
+
+    def save(self, path):
+        with open(path, 'wb') as model_file:
+            pickle.dump(self, model_file)
+
+    @staticmethod
+    def load(path):
+        if not os.path.exists(path):
+            raise Exception("Couldn't find the path %s" % path)
+        with open(path, 'rb') as model_file:
+            return pickle.load(model_file)
+
+
+class AraAnaCascade():
+    '''
+        Runs a HashedNgramClassifier first and sends to the AraAna model only the texts whose
+        first stage probability is below threshold. Texts without any Arabic letter skip both
+        stages and get non_arabic_label with probability 0.
+
+        A share audit_rate of the confident texts is also sent to BERT, so that stats() can
+        report how often the first stage agrees with BERT at every confidence level, not only
+        on the escalated texts. Use it to pick the threshold that fits the latency budget.
+    '''
+
+    def __init__(self, identifier, first_stage=None, threshold=0.9, audit_rate=0.0, non_arabic_label=None,
+                 seed=0):
+        self.__identifier = identifier
+        self.__labels = identifier.labels
+        self.__ind2lab = dict(enumerate(self.__labels))
+        self.first_stage = first_stage
+        self.threshold = threshold
+        self.audit_rate = audit_rate
+        self.non_arabic_label = non_arabic_label
+        self.__random = np.random.default_rng(seed)
+        self.reset_stats()
+
+    def fit(self, sentences, epochs=5, **kwargs):
+        '''
+            Trains the first stage on the predictions AraAna makes for the given sentences.
+        '''
+        label_ids = self.__identifier.predict_sentences(sentences, columnar=True).label_ids
+        self.first_stage = HashedNgramClassifier(len(self.__labels), **kwargs)
+        self.first_stage.fit(_normalizer.normalize_many(sentences), label_ids, epochs=epochs)
+        return self
+
+    def predict(self, text=None, path=None, with_dist=False):
+        if self.first_stage is None:
+            raise Exception('The first stage is not trained, call fit first')
+        sentences = list(_read_sentences(text=text, path=path))
+
+        pred_probs = np.zeros((len(sentences), len(self.__labels)), dtype=np.float32)
+        arabic = np.array([_ARABIC_LETTER.search(sentence) is not None for sentence in sentences], dtype=bool)
+        candidates = np.flatnonzero(arabic)
+
+        if len(candidates):
+            normalized = _normalizer.normalize_many([sentences[i] for i in candidates])
+            first_probs = self.first_stage.predict_proba(normalized)
+            confidence = first_probs.max(axis=1)
+            escalated = confidence < self.threshold
+            audited = ~escalated & (self.__random.random(len(candidates)) < self.audit_rate)
+            to_bert = escalated | audited
+
+            pred_probs[candidates[~to_bert]] = first_probs[~to_bert]
+            if to_bert.any():
+                bert_probs = self.__identifier.predict_sentences([sentences[i] for i in candidates[to_bert]],
+                                                                 columnar=True).probs
+                pred_probs[candidates[to_bert]] = bert_probs
+                self.__record(confidence[to_bert], first_probs[to_bert].argmax(axis=1) == bert_probs.argmax(axis=1),
+                              audited[to_bert])
+            self.__stats['first_stage'] += int((~escalated).sum())
+            self.__stats['escalated'] += int(escalated.sum())
+
+        self.__stats['non_arabic'] += int((~arabic).sum())
+        self.__stats['total'] += len(sentences)
+
+        results = _format_results(pred_probs, self.__ind2lab, with_dist)
+        for i in np.flatnonzero(~arabic):
+            results[i] = (self.non_arabic_label, 0.0) + results[i][2:]
+        return results
+
+    def __record(self, confidence, agreed, audited):
+        self.__stats['compared'] += len(agreed)
+        self.__stats['agreed'] += int(agreed.sum())
+        self.__stats['audited'] += int(audited.sum())
+        bins = np.minimum((confidence * 10).astype(int), 9)
+        np.add.at(self.__compared_by_bin, bins, 1)
+        np.add.at(self.__agreed_by_bin, bins, agreed.astype(int))
+
+    def reset_stats(self):
+        self.__stats = {'total': 0, 'non_arabic': 0, 'first_stage': 0, 'escalated': 0, 'audited': 0,
+                        'compared': 0, 'agreed': 0}
+        self.__compared_by_bin = np.zeros(10, dtype=np.int64)
+        self.__agreed_by_bin = np.zeros(10, dtype=np.int64)
+
+    def stats(self):
+        '''
+            Returns the counters since the last reset_stats, the escalation rate among the
+            Arabic texts, the agreement rate with BERT over every text that went through both
+            stages, and that agreement rate per first stage confidence decile.
+        '''
+        stats = dict(self.__stats)
+        arabic = stats['total'] - stats['non_arabic']
+        stats['escalation_rate'] = stats['escalated'] / arabic if arabic else 0.0
+        stats['agreement_rate'] = stats['agreed'] / stats['compared'] if stats['compared'] else None
+        stats['agreement_by_confidence'] = {
+            '%.1f-%.1f' % (i / 10, (i + 1) / 10): (self.__agreed_by_bin[i] / self.__compared_by_bin[i]
+                                                   if self.__compared_by_bin[i] else None)
+            for i in range(10)}
+        return stats
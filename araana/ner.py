@@ -0,0 +1,209 @@
+# encoding: utf-8
+'''
+    Named entity recognition over texts of any length.
+
+    Every text is split into windows that fit the model, consecutive windows overlap by
+    `stride` tokens (a quarter of the window by default), and the windows of all texts
+    are classified in shared length-bucketed batches. Every token keeps the prediction of the window where it has the most context
+    around it, sub-tokens are averaged into words and consecutive B-/I- words are merged
+    into entities with their character offsets in the text.
+'''
+import optparse
+import os, json
+import sys
+import time
+import numpy as np
+import torch
+from torch import nn
+from transformers import AutoTokenizer, AutoModelForTokenClassification
+
+from . import streaming
+from .aranet import _length_batches
+
+
+class AraNER():
+    '''
+        Token classification model of the `arabic-ner` directory, with windowed inference.
+    '''
+
+    def __init__(self, path, stride=None, max_tokens=8192):
+        # check if gpu is available
+        self.__device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+        # check if the path exists
+        if path is None:
+            raise Exception('Undefined path to model')
+        if not os.path.exists(path):
+            raise Exception("Couldn't find the path %s" % path)
+
+        # load the model
+        try:
+            self.__tokenizer = AutoTokenizer.from_pretrained(path)
+            self.__model = AutoModelForTokenClassification.from_pretrained(path)
+            self.__model = self.__model.to(self.__device).eval()
+        except Exception as e:
+            raise Exception("Couldn't load the model", e)
+        if not self.__tokenizer.is_fast:
+            raise Exception('The NER model needs a fast tokenizer for the character offsets')
+
+        # the windows must fit both the tokenizer and the position embeddings of the model
+        self.__max_length = min(self.__tokenizer.model_max_length, self.__model.config.max_position_embeddings)
+        if stride is None:
+            stride = self.__max_length // 4
+        if not 0 <= stride < self.__max_length // 2:
+            raise Exception('The stride must be between 0 and %d' % (self.__max_length // 2 - 1))
+        self.__stride = stride
+        self.__max_tokens = max_tokens
+        self.__id2label = self.__model.config.id2label
+
+    def predict(self, texts):
+        '''
+            Returns the list of entities of a text, or a list of such lists for a list of
+            texts. Every entity is a dict with the entity type, the word(s), their start and
+            end character offsets in the text and the mean score of the words.
+        '''
+        if isinstance(texts, str):
+            return self.predict([texts])[0]
+        texts = list(texts)
+
+        encoded = self.__tokenizer(texts, truncation=True, max_length=self.__max_length, stride=self.__stride,
+                                   return_overflowing_tokens=True, return_offsets_mapping=True)
+        window_probs = self.__predict_windows(encoded['input_ids'])
+
+        # for every text, the prediction of every token, keyed by its character offsets
+        tokens = [{} for _ in texts]
+        for window, owner in enumerate(encoded['overflow_to_sample_mapping']):
+            word_ids = encoded.word_ids(window)
+            length = len(word_ids)
+            for position, (word_id, offsets) in enumerate(zip(word_ids, encoded['offset_mapping'][window])):
+                if word_id is None:
+                    continue
+                # tokens far from the window edges have the most context on both sides
+                context = min(position, length - 1 - position)
+                best = tokens[owner].get(offsets)
+                if best is None or context > best[0]:
+                    tokens[owner][offsets] = (context, word_id, window_probs[window][position])
+
+        return [_merge_entities(text, _aggregate_words(text_tokens), self.__id2label)
+                for text, text_tokens in zip(texts, tokens)]
+
+    def predict_stream(self, path, output_path=None, checkpoint_path=None, chunk_size=1000):
+        '''
+            Streams a one-document-per-line file through the model chunk by chunk and yields a
+            record per document: its index among the non blank lines and its entities.
+
+            When output_path is given every record is appended to it as a JSON line. When
+            checkpoint_path is given the byte offsets reached in the input and output files are
+            saved once every record of a chunk has been yielded, and a later call with the same
+            paths resumes right after the last saved chunk. Memory only depends on chunk_size, not on the file size.
+        '''
+        state = streaming.load_checkpoint(checkpoint_path)
+        output_file = streaming.open_output(output_path, state['output_offset'])
+        try:
+            for input_offset, texts in streaming.iter_chunks(path, chunk_size, state['input_offset']):
+                records = [{'id': state['count'] + i, 'entities': entities}
+                           for i, entities in enumerate(self.predict(texts))]
+
+                if output_file is not None:
+                    output_file.write(''.join(json.dumps(record, ensure_ascii=False) + '\n'
+                                              for record in records).encode('utf-8'))
+                    output_file.flush()
+                    state['output_offset'] = output_file.tell()
+                state['input_offset'] = input_offset
+                state['count'] += len(records)
+
+                for record in records:
+                    yield record
+                # saved only once the whole chunk was consumed, so a consumer stopped in the middle
+                # of a chunk resumes from its first document
+                streaming.save_checkpoint(checkpoint_path, state)
+        finally:
+            if output_file is not None:
+                output_file.close()
+
+    def __predict_windows(self, input_ids):
+        window_probs = [None] * len(input_ids)
+        pad_id = self.__tokenizer.pad_token_id or 0
+        for indices in _length_batches([len(ids) for ids in input_ids], self.__max_tokens):
+            lengths = np.array([len(input_ids[i]) for i in indices])
+            attention_mask = np.arange(lengths.max()) < lengths[:, None]
+            padded_ids = np.full(attention_mask.shape, pad_id, dtype=np.int64)
+            padded_ids[attention_mask] = np.concatenate([input_ids[i] for i in indices])
+
+            with torch.no_grad():
+                logits = self.__model(input_ids=torch.from_numpy(padded_ids).to(self.__device),
+                                      attention_mask=torch.from_numpy(attention_mask.astype(np.int64))
+                                      .to(self.__device))[0]
+            probs = nn.functional.softmax(logits, dim=-1).cpu().numpy()
+            for row, index in enumerate(indices):
+                window_probs[index] = probs[row, :lengths[row]]
+        return window_probs
+
+
+def _aggregate_words(tokens):
+    '''
+        Averages the sub-token probabilities of every word. Returns (start, end, probs) per
+        word in text order.
+    '''
+    words = {}
+    for (start, end), (_, word_id, probs) in tokens.items():
+        if word_id in words:
+            word = words[word_id]
+            word[0] = min(word[0], start)
+            word[1] = max(word[1], end)
+            word[2] = word[2] + probs
+            word[3] += 1
+        else:
+            words[word_id] = [start, end, probs, 1]
+    return [(start, end, probs / count) for start, end, probs, count in sorted(words.values(), key=lambda w: w[0])]
+
+
+def _merge_entities(text, words, id2label):
+    entities = []
+    current = None
+    for start, end, probs in words:
+        label_id = int(probs.argmax())
+        label = id2label[label_id]
+        if label == 'O':
+            current = None
+            continue
+        prefix, entity_type = label.split('-', 1) if label[:2] in ('B-', 'I-') else ('I', label)
+
+        # an I- word continues the previous entity of the same type, anything else starts a new one
+        if prefix == 'I' and current is not None and current['entity'] == entity_type:
+            current['end'] = end
+            current['scores'].append(float(probs[label_id]))
+        else:
+            current = {'entity': entity_type, 'start': start, 'end': end, 'scores': [float(probs[label_id])]}
+            entities.append(current)
+
+    for entity in entities:
+        entity['word'] = text[entity['start']:entity['end']]
+        entity['score'] = float(np.mean(entity.pop('scores')))
+    return entities
+
+
+def main():
+    parser = optparse.OptionParser(usage='python -m araana.ner -m MODEL_DIR -i INPUT -o OUTPUT [-c CHECKPOINT]')
+    parser.add_option('-m', '--model', dest='model', default='arabic-ner', help='NER model directory')
+    parser.add_option('-i', '--input', dest='input', help='input file with one document per line')
+    parser.add_option('-o', '--output', dest='output', help='output JSONL file')
+    parser.add_option('-c', '--checkpoint', dest='checkpoint', help='checkpoint file to resume an interrupted run')
+    parser.add_option('-s', '--chunk-size', dest='chunk_size', type='int', default=1000,
+                      help='documents read and batched at a time')
+    options, _ = parser.parse_args()
+    if options.input is None or options.output is None:
+        parser.error('the input and output files are required')
+
+    start = time.perf_counter()
+    count = 0
+    for _ in AraNER(options.model).predict_stream(options.input, output_path=options.output,
+                                                  checkpoint_path=options.checkpoint, chunk_size=options.chunk_size):
+        count += 1
+    elapsed = time.perf_counter() - start
+    print('%d documents in %.2fs (%.1f documents/s)' % (count, elapsed, count / elapsed if elapsed else 0.0),
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
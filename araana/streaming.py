@@ -0,0 +1,69 @@
+# encoding: utf-8
+'''
+    Helpers to stream one-sentence-per-line corpus files in chunks and to
+    checkpoint how far a run got, so that an interrupted run can resume.
+'''
+import os, json
+
+
+def iter_lines(path, offset=0):
+    '''
+        Yields (end_offset, line) for every non blank line of the file, starting at
+        the byte offset `offset`. end_offset is the byte offset right after the line.
+    '''
+    if not os.path.exists(path):
+        raise Exception("File not found %s" % path)
+    with open(path, 'rb') as input_file:
+        input_file.seek(offset)
+        for raw_line in input_file:
+            offset += len(raw_line)
+            line = raw_line.decode('utf-8').rstrip('\r\n')
+            if line.strip():
+                yield offset, line
+
+
+def iter_chunks(path, chunk_size, offset=0):
+    '''
+        Yields (end_offset, lines) with at most chunk_size lines at a time.
+    '''
+    chunk = []
+    for end_offset, line in iter_lines(path, offset):
+        chunk.append(line)
+        if len(chunk) == chunk_size:
+            yield end_offset, chunk
+            chunk = []
+    if chunk:
+        yield end_offset, chunk
+
+
+def load_checkpoint(checkpoint_path):
+    '''
+        Returns the saved state, or a fresh state when there is no checkpoint yet.
+    '''
+    if checkpoint_path is None or not os.path.exists(checkpoint_path):
+        return {'input_offset': 0, 'output_offset': 0, 'count': 0}
+    with open(checkpoint_path) as json_file:
+        return json.load(json_file)
+
+
+def save_checkpoint(checkpoint_path, state):
+    if checkpoint_path is None:
+        return
+    # write to a temporary file first so a crash never leaves a truncated checkpoint
+    tmp_path = checkpoint_path + '.tmp'
+    with open(tmp_path, 'w') as json_file:
+        json.dump(state, json_file)
+    os.replace(tmp_path, checkpoint_path)
+
+
+def open_output(output_path, output_offset=0):
+    '''
+        Opens the output file for appending at output_offset, dropping anything written
+        after the last checkpoint.
+    '''
+    if output_path is None:
+        return None
+    output_file = open(output_path, 'r+b' if output_offset and os.path.exists(output_path) else 'wb')
+    output_file.truncate(output_offset)
+    output_file.seek(output_offset)
+    return output_file
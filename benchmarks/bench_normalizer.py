@@ -0,0 +1,171 @@
+# encoding: utf-8
+'''
+    Benchmark of the Arabic normalizer against its previous implementation.
+
+    Usage: python benchmarks/bench_normalizer.py [corpus.tsv] [--jobs N]
+
+    Without a corpus a synthetic set of tweets is generated. Both implementations
+    must give the same output for every text before any timing is reported.
+'''
+import os
+import re
+import sys
+import random
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from araana.aranet import _araNorm
+
+
+class _LegacyAraNorm():
+    '''
+        The normalizer as it was before the translation table and the precompiled
+        regular expressions, kept as the reference for the benchmark.
+    '''
+
+    def __init__(self):
+        '''
+        List of normalized characters
+        '''
+        self.normalize_chars = {u"\u0622": u"\u0627", u"\u0623": u"\u0627", u"\u0625": u"\u0627",
+                                # All Araf forms to Alaf without hamza
+                                u"\u0649": u"\u064A",  # ALEF MAKSURA to YAH
+                                u"\u0629": u"\u0647"  # TEH MARBUTA to  HAH
+                                }
+        '''
+        list of diac unicode and underscore
+        '''
+        self.Tashkeel_underscore_chars = {u"\u0640": "_", u"\u064E": 'a', u"\u064F": 'u', u"\u0650": 'i',
+                                          u"\u0651": '~', u"\u0652": 'o', u"\u064B": 'F', u"\u064C": 'N',
+                                          u"\u064D": 'K'}
+
+    def __normalizeChar(self, inputText):
+        '''
+        step #2: Normalize Alef and Yeh forms
+        '''
+        norm = ""
+        for char in inputText:
+            if char in self.normalize_chars:
+                norm = norm + self.normalize_chars[char]
+            else:
+                norm = norm + char
+        return norm
+
+    def __remover_tashkeel(self, inputText):
+        '''
+        step #3: Remove Tashkeeel (diac) from Atabic text
+        '''
+        text_without_Tashkeel = ""
+        for char in inputText:
+            if char not in self.Tashkeel_underscore_chars:
+                text_without_Tashkeel += char
+        return text_without_Tashkeel
+
+    def __reduce_characters(self, inputText):
+        '''
+        step #4: Reduce character repitation of > 2 characters at time
+                 For example: the word 'cooooool' will convert to 'cool'
+        '''
+        # pattern to look for three or more repetitions of any character, including
+        # newlines.
+        pattern = re.compile(r"(.)\1{2,}", re.DOTALL)
+        reduced_text = pattern.sub(r"\1\1", inputText)
+        return reduced_text
+
+    def __replace_links(self, inputText):
+        '''
+        step #5: repalce links to LINK
+                 For example: http://too.gl/sadsad322 will replaced to LINK
+        '''
+        text = re.sub('(\w+:\/\/[ ]*\S+)', '+++++++++', inputText)  # LINK
+        text = re.sub('\++', 'URL', text)
+        return re.sub('(URL\s*)+', ' URL ', text)
+
+    def __replace_username(self, inputText):
+        '''
+        step #5: Remove twitter username with the word USER
+                 For example: @elmadany will replaced by space
+        '''
+        text = re.sub('(@[a-zA-Z0-9_]+)', 'USER', inputText)
+        return re.sub('(USER\s*)+', ' USER ', text)
+
+    def __replace_Number(self, inputText):
+        '''
+        step #7: replace number with NUM
+                 For example: \d+ will replaced with NUM
+        '''
+        text = re.sub('[\d\.]+', 'NUM', inputText)
+        return re.sub('(NUM\s*)+', ' NUM ', text)
+
+    def __remove_nonLetters_Digits(self, inputText):
+        '''
+        step #8: Remove non letters or digits characters
+                 For example: emoticons...etc
+                 this step is very important for w2v  and similar models; and dictionary
+        '''
+        p1 = re.compile('[\W_\d\s]', re.IGNORECASE | re.UNICODE)  # re.compile('\p{Arabic}')
+        sent = re.sub(p1, ' ', inputText)
+        p1 = re.compile('\s+')
+        sent = re.sub(p1, ' ', sent)
+        return sent
+
+    def run(self, text):
+        normtext = ""
+        text = self.__normalizeChar(text)
+        text = self.__remover_tashkeel(text)
+        text = self.__reduce_characters(text)
+        text = self.__replace_links(text)
+        text = self.__replace_username(text)
+        text = self.__replace_Number(text)
+        text = self.__remove_nonLetters_Digits(text)
+        text = re.sub('\s+', ' ', text.strip())
+        text = re.sub('\s+$', '', text.strip())
+        normtext = re.sub('^\s+', '', text.strip())
+        return normtext
+
+
+def synthetic_corpus(size=20000, seed=0):
+    random.seed(seed)
+    words = ['\u0648\u0646\u0642\u0644\u062a', '\u0648\u0643\u0627\u0644\u0629', '\u0631\u0648\u064a\u062a\u0631\u0632',
+             '\u0623\u0646\u0651', '\u0625\u0644\u0649', '\u062c\u062f\u0627\u0627\u0627\u0627',
+             '\u0645\u064e\u0631\u062d\u064e\u0628\u0627', '@user_1', 'http://t.co/abc123', '2024', '3.5', '\U0001F600', '!!!', 'ok']
+    return [' '.join(random.choice(words) for _ in range(random.randint(5, 40))) for _ in range(size)]
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    args = sys.argv[1:]
+    jobs = 1
+    if '--jobs' in args:
+        jobs = int(args[args.index('--jobs') + 1])
+        del args[args.index('--jobs'):args.index('--jobs') + 2]
+    if args:
+        with open(args[0], encoding='utf-8') as corpus_file:
+            texts = [line.rstrip('\n') for line in corpus_file]
+    else:
+        texts = synthetic_corpus()
+
+    legacy = _LegacyAraNorm()
+    expected, legacy_time = timed(lambda: [_LegacyAraNorm().run(text) for text in texts])
+    normalized, new_time = timed(_araNorm().normalize_many, texts)
+    if normalized != expected:
+        raise SystemExit('The normalizers disagree on %d texts' % sum(a != b for a, b in zip(normalized, expected)))
+
+    print('texts: %d' % len(texts))
+    print('legacy, new instance per text: %.3fs' % legacy_time)
+    _, shared_time = timed(lambda: [legacy.run(text) for text in texts])
+    print('legacy, shared instance:       %.3fs' % shared_time)
+    print('normalize_many:                %.3fs (%.1fx)' % (new_time, legacy_time / new_time))
+    if jobs > 1:
+        _, pool_time = timed(lambda: _araNorm().normalize_many(texts, n_jobs=jobs))
+        print('normalize_many, %d jobs:       %.3fs (%.1fx)' % (jobs, pool_time, legacy_time / pool_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+# encoding: utf-8
+'''
+    Micro-benchmarks of the shared text kernel of Final/ against the per-character
+    loops it replaced.
+
+    Usage: python benchmarks/bench_text_kernel.py [corpus.txt] [--repeat N]
+
+    Without a corpus a synthetic set of mixed Arabic / Latin texts is generated. A second
+    set of texts made of very long tokens (no spaces) is always run as well, to catch
+    regular expressions that backtrack quadratically within a token. Every kernel function
+    must give the same result as its legacy version on every text before any timing is
+    reported.
+'''
+import os
+import re
+import sys
+import random
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Final import text_kernel
+
+
+def legacy_total_arabic_word_count(text):
+    total_count = 0
+    for word in text.split():
+        cleaned_word = ''.join(c for c in word if '\u0600' <= c <= '\u06FF' or c == ' ')
+        if cleaned_word.strip():
+            total_count += 1
+    return total_count
+
+
+def legacy_total_arabic_character_count(text):
+    total_count = 0
+    for char in text:
+        if '\u0600' <= char <= '\u06FF':
+            total_count += 1
+    return total_count
+
+
+def legacy_calculate_arabic_vocabulary(text):
+    arabic_words = set()
+    for word in text.split():
+        cleaned_word = ''.join(c for c in word if '\u0600' <= c <= '\u06FF')
+        if cleaned_word.strip():
+            arabic_words.add(cleaned_word)
+    return len(arabic_words)
+
+
+def legacy_tokenize_words(text):
+    words = re.findall(r'\b\w+\b', text)
+    return [word for word in words if any('\u0600' <= char <= '\u06FF' for char in word)]
+
+
+def legacy_syllables(text):
+    vowels = "aeiouAEIOU\u0627\u0648\u0649"
+    return [sum(1 for char in word if char in vowels) for word in legacy_tokenize_words(text)]
+
+
+def legacy_punctuation_count(text):
+    return len(re.findall(r'[.\u060c!?\u061b:]', text))
+
+
+def kernel_vocabulary(text):
+    return len(set(text_kernel.arabic_tokens(text)))
+
+
+def kernel_syllables(text):
+    return [text_kernel.count_syllables(word) for word in text_kernel.arabic_words(text)]
+
+
+CASES = [
+    ('arabic word count', legacy_total_arabic_word_count, text_kernel.count_arabic_tokens),
+    ('arabic character count', legacy_total_arabic_character_count, text_kernel.count_arabic_characters),
+    ('arabic vocabulary', legacy_calculate_arabic_vocabulary, kernel_vocabulary),
+    ('arabic words', legacy_tokenize_words, text_kernel.arabic_words),
+    ('syllables per word', legacy_syllables, kernel_syllables),
+    ('punctuation count', legacy_punctuation_count, text_kernel.count_punctuation),
+]
+
+
+def synthetic_corpus(size=5000, seed=0):
+    random.seed(seed)
+    words = ['\u0648\u0646\u0642\u0644\u062a', '\u0648\u0643\u0627\u0644\u0629', '\u0641\u064a',
+             '\u0627\u0644\u0630\u064a', '\u0645\u064e\u0631\u062d\u064e\u0628\u0627', 'abc\u0639\u0631\u0628',
+             '\u0661\u0662\u0663', '2024', 'hello', '\u060c', '\u061f', '.', '!', '\u0643\u062a\u0627\u0628.']
+    return [' '.join(random.choice(words) for _ in range(random.randint(10, 200))) for _ in range(size)]
+
+
+def long_token_texts(length=40000):
+    # a single token without Arabic, Arabic at either end of a long Latin token, and a long unspaced mix
+    return ['a' * length,
+            '\u0628' + 'a' * length,
+            'a' * length + '\u0628',
+            'ab\u0639\u0631' * (length // 4),
+            ' '.join(['a' * length, '\u0641\u064a', 'b' * length])]
+
+
+def timed(function, texts, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = [function(text) for text in texts]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    args = sys.argv[1:]
+    repeat = 3
+    if '--repeat' in args:
+        repeat = int(args[args.index('--repeat') + 1])
+        del args[args.index('--repeat'):args.index('--repeat') + 2]
+    if args:
+        with open(args[0], encoding='utf-8') as corpus_file:
+            texts = [line.rstrip('\n') for line in corpus_file]
+    else:
+        texts = synthetic_corpus()
+
+    for label, texts in (('texts', texts), ('long token texts', long_token_texts())):
+        print('%s: %d, best of %d' % (label, len(texts), repeat))
+        for name, legacy, kernel in CASES:
+            expected, legacy_time = timed(legacy, texts, repeat)
+            result, kernel_time = timed(kernel, texts, repeat)
+            if result != expected:
+                raise SystemExit('%s: the kernel disagrees on %d texts'
+                                 % (name, sum(a != b for a, b in zip(result, expected))))
+            print('%-24s legacy %.3fs  kernel %.3fs  (%.1fx)' % (name, legacy_time, kernel_time,
+                                                               legacy_time / kernel_time))
+
+
+if __name__ == '__main__':
+    main()